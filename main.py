@@ -23,6 +23,8 @@ def main():
     parser.add_argument("-w", "--workdir", type=str, nargs=1, default=None, metavar="work_directory",
                         help="A path to the current work directory")
     parser.add_argument("--close", action="store_true", help="Should the terminal close after running")
+    parser.add_argument("--watch", action="store_true",
+                        help="Rebuild the pack whenever its files, patches or config change")
     args = parser.parse_args()
 
     # Setup logging
@@ -53,7 +55,7 @@ def main():
             config = args.config
 
         if args.build:
-            Packer().start(pack, run_option, config, args.close)
+            Packer().start(pack, run_option, config, args.close, args.watch)
         if args.setup:
             dependencies.setup(pack, config)
         
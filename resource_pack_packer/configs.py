@@ -10,6 +10,8 @@ from resource_pack_packer.console import choose_from_list
 from resource_pack_packer.patch import PatchFile
 from resource_pack_packer.settings import MAIN_SETTINGS
 from resource_pack_packer.settings import parse_keyword
+from resource_pack_packer.util.zipper import DEFAULT_COMPRESSION_LEVEL
+from resource_pack_packer.validation import ReportFormat
 
 
 def parse_name_scheme_keywords(scheme: str, name: str, version: str, mc_version: str):
@@ -206,7 +208,9 @@ class Config:
 
 class RunOptions:
     def __init__(self, name: str, configs: Union[List[str], str], minify_json: bool, delete_empty_folders: bool,
-                 zip_pack: bool, out_dir: str, version: Optional[str], rerun: bool, validate: bool):
+                 zip_pack: bool, out_dir: str, version: Optional[str], rerun: bool, validate: bool,
+                 incremental: bool = False, virtual: bool = False,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL, validation_report: Optional[ReportFormat] = None):
         self.name = name
         self.configs = configs
         self.minify_json = minify_json
@@ -216,6 +220,10 @@ class RunOptions:
         self.version = version
         self.rerun = rerun
         self.validate = validate
+        self.incremental = incremental
+        self.virtual = virtual
+        self.compression_level = compression_level
+        self.validation_report = validation_report
 
     def get_configs(self, configs: List[Config], logger: logging.Logger,
                     config_override: Optional[List[int | str] | str] = None) -> Tuple[List[Config], List[int]]:
@@ -286,6 +294,26 @@ class RunOptions:
             else:
                 validate = False
 
+            if "incremental" in value:
+                incremental = value["incremental"]
+            else:
+                incremental = False
+
+            if "virtual" in value:
+                virtual = value["virtual"]
+            else:
+                virtual = False
+
+            if "compression_level" in value:
+                compression_level = value["compression_level"]
+            else:
+                compression_level = DEFAULT_COMPRESSION_LEVEL
+
+            if "validation_report" in value and value["validation_report"] is not None:
+                validation_report = ReportFormat(value["validation_report"])
+            else:
+                validation_report = None
+
             run_options.append(RunOptions(
                 key,
                 value["configs"],
@@ -295,7 +323,11 @@ class RunOptions:
                 out_dir,
                 version,
                 rerun,
-                validate
+                validate,
+                incremental,
+                virtual,
+                compression_level,
+                validation_report
             ))
         return run_options
 
@@ -0,0 +1,413 @@
+import copy
+from array import array
+from typing import Optional
+
+from resource_pack_packer.selectors import Direction
+
+# Values stored per element: the x, y and z of 'from', followed by the x, y and z of 'to'
+STRIDE = 6
+
+AXES = ("x", "y", "z")
+
+# The faces on each axis
+_AXIS_DIRECTIONS = ((Direction.EAST.value, Direction.WEST.value),
+                    (Direction.UP.value, Direction.DOWN.value),
+                    (Direction.NORTH.value, Direction.SOUTH.value))
+
+# The direction that each face points in
+_NORMALS = {Direction.EAST.value: (1, 0, 0), Direction.WEST.value: (-1, 0, 0),
+            Direction.UP.value: (0, 1, 0), Direction.DOWN.value: (0, -1, 0),
+            Direction.SOUTH.value: (0, 0, 1), Direction.NORTH.value: (0, 0, -1)}
+_DIRECTIONS = {normal: direction for direction, normal in _NORMALS.items()}
+
+# The directions that a face's texture u and v point in, before the face is rotated. Matches the uv that Minecraft
+# generates for faces without one
+_UV_AXES = {Direction.DOWN.value: ((1, 0, 0), (0, 0, -1)), Direction.UP.value: ((1, 0, 0), (0, 0, 1)),
+            Direction.NORTH.value: ((-1, 0, 0), (0, -1, 0)), Direction.SOUTH.value: ((1, 0, 0), (0, -1, 0)),
+            Direction.WEST.value: ((0, 0, 1), (0, -1, 0)), Direction.EAST.value: ((0, 0, -1), (0, -1, 0))}
+
+# Angles that Minecraft allows for element rotations
+ELEMENT_ANGLES = (-45, -22.5, 0, 22.5, 45)
+
+Matrix = list[list[float]]
+
+
+def identity_matrix() -> Matrix:
+    return [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+
+
+def multiply(a: Matrix, b: Matrix) -> Matrix:
+    """
+    :return: A matrix that applies 'b' and then 'a'
+    """
+    return [[sum(a[row][i] * b[i][column] for i in range(4)) for column in range(4)] for row in range(4)]
+
+
+def translation_matrix(x: float, y: float, z: float) -> Matrix:
+    return [[1, 0, 0, x], [0, 1, 0, y], [0, 0, 1, z], [0, 0, 0, 1]]
+
+
+def _around(matrix: Matrix, origin: list[float]) -> Matrix:
+    """Makes a matrix use 'origin' as its center"""
+    return multiply(translation_matrix(*origin), multiply(matrix, translation_matrix(*(-o for o in origin))))
+
+
+def scale_matrix(x: float, y: float, z: float, origin: list[float]) -> Matrix:
+    return _around([[x, 0, 0, 0], [0, y, 0, 0], [0, 0, z, 0], [0, 0, 0, 1]], origin)
+
+
+def rotation_matrix(axis: str, turns: int, origin: list[float]) -> Matrix:
+    """
+    :param axis: The axis to turn around
+    :param turns: The amount of counterclockwise 90 degree turns, looking from the positive end of the axis
+    :param origin: The point to turn around
+    """
+    cos = (1, 0, -1, 0)[turns % 4]
+    sin = (0, 1, 0, -1)[turns % 4]
+    match axis:
+        case "x":
+            matrix = [[1, 0, 0, 0], [0, cos, -sin, 0], [0, sin, cos, 0], [0, 0, 0, 1]]
+        case "y":
+            matrix = [[cos, 0, sin, 0], [0, 1, 0, 0], [-sin, 0, cos, 0], [0, 0, 0, 1]]
+        case "z":
+            matrix = [[cos, -sin, 0, 0], [sin, cos, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+        case _:
+            raise ValueError(f"Incorrect rotation axis: {axis}")
+    return _around(matrix, origin)
+
+
+class AxisMap:
+    """
+    The part of a matrix that moves axes onto other axes. Only matrices that keep elements aligned to the axes have one
+    """
+
+    def __init__(self, matrix: Matrix):
+        # New axis -> the old axis it comes from
+        self.sources = []
+        # New axis -> the scale of the old axis
+        self.scales = []
+        for row in matrix[:3]:
+            columns = [column for column in range(3) if row[column] != 0]
+            if len(columns) != 1:
+                raise ValueError(f"Matrix doesn't keep elements aligned to the axes: {matrix}")
+            self.sources.append(columns[0])
+            self.scales.append(row[columns[0]])
+        if sorted(self.sources) != [0, 1, 2]:
+            raise ValueError(f"Matrix doesn't keep elements aligned to the axes: {matrix}")
+
+        inversions = sum(1 for i in range(3) for j in range(i + 1, 3) if self.sources[i] > self.sources[j])
+        negatives = sum(1 for scale in self.scales if scale < 0)
+        # Mirrored matrices turn rotations the other way
+        self.mirrors = (inversions + negatives) % 2 == 1
+
+    def map(self, vector: tuple) -> tuple:
+        """Moves a direction"""
+        return tuple(vector[source] if scale > 0 else -vector[source]
+                     for source, scale in zip(self.sources, self.scales))
+
+    def map_direction(self, direction: str) -> str:
+        if direction not in _NORMALS:
+            return direction
+        return _DIRECTIONS[self.map(_NORMALS[direction])]
+
+
+def _texture_axes(direction: str, rotation: int) -> tuple[tuple, tuple]:
+    """
+    :return: The directions that a face's texture u and v point in
+    """
+    u, v = _UV_AXES[direction]
+    match rotation % 360:
+        case 90:
+            return v, _negate(u)
+        case 180:
+            return _negate(u), _negate(v)
+        case 270:
+            return _negate(v), u
+        case _:
+            return u, v
+
+
+def _negate(vector: tuple) -> tuple:
+    return tuple(-value for value in vector)
+
+
+def _flip_uv_x(uv: list[float]) -> list[float]:
+    return [uv[2], uv[1], uv[0], uv[3]]
+
+
+def _flip_uv_y(uv: list[float]) -> list[float]:
+    return [uv[0], uv[3], uv[2], uv[1]]
+
+
+def _is_vertical(direction: str) -> bool:
+    return direction == Direction.UP.value or direction == Direction.DOWN.value
+
+
+class Face:
+    """
+    A face of an element. The values that transforms change are kept apart from the rest of the face's json
+    """
+    __slots__ = ("direction", "uv", "cullface", "rotation", "data")
+
+    def __init__(self, direction: str, data: dict):
+        self.direction = direction
+        self.uv: Optional[list] = list(data["uv"]) if "uv" in data else None
+        self.cullface: Optional[str] = data.get("cullface")
+        self.rotation: int = data.get("rotation", 0)
+        self.data = data
+
+    def copy(self) -> "Face":
+        face = Face.__new__(Face)
+        face.direction = self.direction
+        face.uv = self.uv
+        face.cullface = self.cullface
+        face.rotation = self.rotation
+        face.data = self.data
+        return face
+
+    def flip(self, x: bool, y: bool, z: bool):
+        """
+        Mirrors the face along the flipped axes
+        """
+        flips = (x, y, z)
+        if any(flip and self.direction in _AXIS_DIRECTIONS[axis] for axis, flip in enumerate(flips)):
+            self.direction = Direction.flip(self.direction)
+
+        # Culling
+        if self.cullface is not None and \
+                any(flip and self.cullface in _AXIS_DIRECTIONS[axis] for axis, flip in enumerate(flips)):
+            self.cullface = Direction.flip(self.cullface)
+
+        # UV
+        if self.uv is not None:
+            vertical = _is_vertical(self.direction)
+            if x:
+                self.uv = _flip_uv_x(self.uv) if vertical else _flip_uv_y(self.uv)
+            if z:
+                self.uv = _flip_uv_y(self.uv) if vertical else _flip_uv_x(self.uv)
+            if y and not vertical:
+                self.uv = _flip_uv_x(self.uv)
+
+    def transform(self, axis_map: AxisMap):
+        """
+        Moves the face with its element. The texture keeps its orientation on the element by rotating or flipping
+        the uv
+        """
+        if self.uv is not None and self.direction in _UV_AXES:
+            texture_u, texture_v = map(axis_map.map, _texture_axes(self.direction, self.rotation))
+        self.direction = axis_map.map_direction(self.direction)
+        if self.cullface is not None:
+            self.cullface = axis_map.map_direction(self.cullface)
+
+        if self.uv is None or self.direction not in _UV_AXES:
+            return
+        # The rotation that needs the fewest flips, trying the current rotation first
+        best = None
+        for turns in range(4):
+            rotation = (self.rotation + 90 * turns) % 360
+            u, v = _texture_axes(self.direction, rotation)
+            if texture_u in (u, _negate(u)) and texture_v in (v, _negate(v)):
+                flips = (texture_u != u, texture_v != v)
+                if best is None or sum(flips) < sum(best[1]):
+                    best = (rotation, flips)
+        self.rotation, (flip_u, flip_v) = best
+        if flip_u:
+            self.uv = [self.uv[2], self.uv[1], self.uv[0], self.uv[3]]
+        if flip_v:
+            self.uv = [self.uv[0], self.uv[3], self.uv[2], self.uv[1]]
+
+    def to_json(self) -> dict:
+        face = {}
+        for key, value in self.data.items():
+            if key == "uv":
+                face[key] = list(self.uv)
+            elif key == "cullface":
+                face[key] = self.cullface
+            elif key == "rotation":
+                face[key] = self.rotation
+            else:
+                face[key] = copy.deepcopy(value)
+        if "rotation" not in self.data and self.rotation != 0:
+            face["rotation"] = self.rotation
+        return face
+
+
+class ElementGeometry:
+    """
+    The elements of a model with their positions packed into arrays, so transforms run over every element at once.
+    Values that were whole numbers in json are tracked, so they are written back the same way.
+    """
+    __slots__ = ("positions", "ints", "faces", "rotations", "data")
+
+    def __init__(self):
+        self.positions = array("d")
+        # 1 where the value is a json integer
+        self.ints = array("b")
+        # The faces of each element. None if the element has no faces
+        self.faces: list[Optional[list[Face]]] = []
+        # The rotation of each element. Rotations are replaced instead of edited, so they can be shared
+        self.rotations: list[Optional[dict]] = []
+        # The json that each element was read from. Only used for values that aren't transformed
+        self.data: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @staticmethod
+    def from_elements(elements: list[dict]) -> "ElementGeometry":
+        """
+        :param elements: The elements of a model. They are never modified
+        """
+        geometry = ElementGeometry()
+        for element in elements:
+            values = [*element["from"], *element["to"]]
+            geometry.positions.extend(map(float, values))
+            geometry.ints.extend(isinstance(value, int) for value in values)
+            geometry.faces.append([Face(direction, face) for direction, face in element["faces"].items()]
+                                  if "faces" in element else None)
+            geometry.rotations.append(element.get("rotation"))
+            geometry.data.append(element)
+        return geometry
+
+    def extend(self, other: "ElementGeometry"):
+        """
+        Adds the elements of another geometry after this geometry's elements
+        """
+        self.positions.extend(other.positions)
+        self.ints.extend(other.ints)
+        self.faces += [None if faces is None else [face.copy() for face in faces] for faces in other.faces]
+        self.rotations += other.rotations
+        self.data += other.data
+
+    def _column(self, column: int) -> array:
+        return self.positions[column::STRIDE]
+
+    def translate(self, x: float, y: float, z: float):
+        for axis, offset in enumerate((x, y, z)):
+            for column in (axis, axis + 3):
+                self.positions[column::STRIDE] = array("d", [value + offset for value in self._column(column)])
+                if not isinstance(offset, int):
+                    self.ints[column::STRIDE] = array("b", bytes(len(self)))
+
+    def flip(self, origin: list[float], x: bool, y: bool, z: bool):
+        """
+        Mirrors every element along the flipped axes
+        :param origin: The point to mirror around
+        """
+        for axis, flip in enumerate((x, y, z)):
+            if not flip:
+                continue
+
+            center = origin[axis]
+            from_values = self._column(axis)
+            to_values = self._column(axis + 3)
+            self.positions[axis::STRIDE] = array("d", [center + (center - value) for value in to_values])
+            self.positions[axis + 3::STRIDE] = array("d", [center + (center - value) for value in from_values])
+
+            if isinstance(center, int):
+                from_ints = self.ints[axis::STRIDE]
+                self.ints[axis::STRIDE] = self.ints[axis + 3::STRIDE]
+                self.ints[axis + 3::STRIDE] = from_ints
+            else:
+                self.ints[axis::STRIDE] = self.ints[axis + 3::STRIDE] = array("b", bytes(len(self)))
+
+        for faces in self.faces:
+            if faces is not None:
+                for face in faces:
+                    face.flip(x, y, z)
+
+    def transform(self, matrix: Matrix):
+        """
+        Moves every element with an affine matrix. Elements must stay aligned to the axes, so the matrix can only
+        move, scale, mirror and turn them in 90 degree steps
+        :param matrix: A 4x4 matrix that is applied to column vectors
+        """
+        axis_map = AxisMap(matrix)
+        columns = [self._column(column) for column in range(STRIDE)]
+        ints = [self.ints[column::STRIDE] for column in range(STRIDE)]
+
+        for axis, (source, scale) in enumerate(zip(axis_map.sources, axis_map.scales)):
+            offset = matrix[axis][3]
+            low_column, high_column = (source, source + 3) if scale > 0 else (source + 3, source)
+            for column, source_column in ((axis, low_column), (axis + 3, high_column)):
+                values = array("d", [scale * value + offset for value in columns[source_column]])
+                self.positions[column::STRIDE] = values
+                # Whole numbers stay whole numbers
+                self.ints[column::STRIDE] = array("b", [is_int and value.is_integer()
+                                                        for is_int, value in zip(ints[source_column], values)])
+
+        for faces in self.faces:
+            if faces is not None:
+                for face in faces:
+                    face.transform(axis_map)
+
+        self.rotations = [None if rotation is None else _transform_rotation(rotation, matrix, axis_map)
+                          for rotation in self.rotations]
+
+    def rotate(self, axis: str, angle: float, origin: list[float], rescale: bool = False):
+        """
+        Sets the rotation of every element. Elements that are already rotated must be rotated around the same axis
+        and origin
+        :param angle: One of 'ELEMENT_ANGLES', added to the current rotation
+        :param rescale: Should the rotated elements be scaled to fill the block
+        """
+        origin = list(origin)
+        for i, rotation in enumerate(self.rotations):
+            if rotation is None:
+                rotation = {"origin": origin, "axis": axis, "angle": angle}
+            elif rotation.get("axis") == axis and rotation.get("origin") == origin and \
+                    rotation.get("angle", 0) + angle in ELEMENT_ANGLES:
+                rotation = rotation | {"angle": rotation.get("angle", 0) + angle}
+            else:
+                raise ValueError(f"Element rotation can't be combined with a {angle} degree rotation around {axis}: "
+                                 f"{rotation}")
+            if rescale:
+                rotation |= {"rescale": True}
+            self.rotations[i] = rotation
+
+    def to_elements(self) -> list[dict]:
+        """
+        :return: The elements as json, with every key in its original order
+        """
+        elements = []
+        for i, data in enumerate(self.data):
+            start = i * STRIDE
+            values = [int(value) if is_int else value
+                      for value, is_int in zip(self.positions[start:start + STRIDE], self.ints[start:start + STRIDE])]
+
+            element = {}
+            for key, value in data.items():
+                if key == "from":
+                    element[key] = values[:3]
+                elif key == "to":
+                    element[key] = values[3:]
+                elif key == "faces":
+                    element[key] = {face.direction: face.to_json() for face in self.faces[i]}
+                elif key == "rotation":
+                    element[key] = copy.deepcopy(self.rotations[i])
+                else:
+                    element[key] = copy.deepcopy(value)
+            if "rotation" not in data and self.rotations[i] is not None:
+                element["rotation"] = copy.deepcopy(self.rotations[i])
+            elements.append(element)
+        return elements
+
+
+def _transform_rotation(rotation: dict, matrix: Matrix, axis_map: AxisMap) -> dict:
+    """
+    Moves an element's rotation with its element
+    """
+    rotation = copy.deepcopy(rotation)
+    if "origin" in rotation:
+        origin = rotation["origin"]
+        moved = [sum(matrix[row][i] * origin[i] for i in range(3)) + matrix[row][3] for row in range(3)]
+        rotation["origin"] = [int(value) if isinstance(origin[axis_map.sources[row]], int) and
+                              float(value).is_integer() else value for row, value in enumerate(moved)]
+    if rotation.get("axis") in AXES:
+        source = AXES.index(rotation["axis"])
+        axis = axis_map.sources.index(source)
+        rotation["axis"] = AXES[axis]
+        # Turning around the opposite end of an axis, or in a mirror, turns the other way
+        if "angle" in rotation and (axis_map.scales[axis] < 0) != axis_map.mirrors:
+            rotation["angle"] = -rotation["angle"]
+    return rotation
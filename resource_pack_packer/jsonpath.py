@@ -0,0 +1,144 @@
+import copy
+import re
+from enum import Enum
+from typing import Union, Optional
+
+Container = Union[dict, list]
+
+
+class SegmentType(Enum):
+    NAME = "name"
+    WILDCARD = "*"
+    DESCENT = "**"
+
+
+class Segment:
+    __slots__ = ("type", "name", "index")
+
+    def __init__(self, segment_type: SegmentType, name: Optional[str] = None):
+        self.type = segment_type
+        self.name = name
+        # Names that are numbers also select list items
+        self.index = int(name) if name is not None and re.fullmatch(r"-?\d+", name) else None
+
+    @staticmethod
+    def parse(segment: str) -> "Segment":
+        if segment == SegmentType.WILDCARD.value:
+            return Segment(SegmentType.WILDCARD)
+        elif segment == SegmentType.DESCENT.value:
+            return Segment(SegmentType.DESCENT)
+        return Segment(SegmentType.NAME, segment)
+
+
+def _children(node: Container) -> list[tuple[Container, Union[str, int]]]:
+    if isinstance(node, dict):
+        return [(node, key) for key in node.keys()]
+    elif isinstance(node, list):
+        return [(node, i) for i in range(len(node))]
+    return []
+
+
+def _descendants(node: Container) -> list[tuple[Container, Union[str, int]]]:
+    """Every (container, key) pair below a node, parents first"""
+    descendants = []
+    stack = [node]
+    while len(stack) > 0:
+        children = _children(stack.pop())
+        descendants += children
+        stack += reversed([container[key] for container, key in children
+                           if isinstance(container[key], (dict, list))])
+    return descendants
+
+
+class JsonPath:
+    """
+    A compiled location in a json document, like 'variants/*/model'. Segments are separated by '/':
+    - A name selects a key of an object. Names that are numbers also select an index of a list
+    - '*' selects every value of an object or list
+    - '**' selects the node and everything below it
+    """
+
+    def __init__(self, location: str):
+        self.location = location
+        self.segments = tuple(map(Segment.parse, location.split("/")))
+
+    def __str__(self):
+        return self.location
+
+    def targets(self, root: Container, add: bool = False) -> list[tuple[Container, Union[str, int]]]:
+        """
+        Finds every location that the path points to
+        :param root: The json document
+        :param add: Should missing objects on the way be created. If False, then only the last name can be missing
+        :return: The container and key of every location. The key might not exist yet
+        """
+        nodes = [root]
+        for segment in self.segments[:-1]:
+            next_nodes = []
+            for node in nodes:
+                if segment.type == SegmentType.DESCENT:
+                    next_nodes.append(node)
+                    next_nodes += [container[key] for container, key in _descendants(node)]
+                    continue
+
+                for container, key in self._select(node, segment):
+                    if isinstance(container, dict) and key not in container:
+                        if not add:
+                            continue
+                        container[key] = {}
+                    next_nodes.append(container[key])
+            nodes = [node for node in next_nodes if isinstance(node, (dict, list))]
+
+        last = self.segments[-1]
+        targets = []
+        for node in nodes:
+            if last.type == SegmentType.DESCENT:
+                targets += _descendants(node)
+            else:
+                targets += self._select(node, last)
+        return targets
+
+    @staticmethod
+    def _select(node: Container, segment: Segment) -> list[tuple[Container, Union[str, int]]]:
+        if segment.type == SegmentType.WILDCARD:
+            return _children(node)
+        elif isinstance(node, dict):
+            return [(node, segment.name)]
+        elif isinstance(node, list) and segment.index is not None and -len(node) <= segment.index < len(node):
+            return [(node, segment.index)]
+        return []
+
+    def set(self, root: Container, data, merge: bool = False, add: bool = True) -> Container:
+        """
+        Sets every location that the path points to
+        :param root: The json document
+        :param data: The new value. Each location gets its own copy
+        :param merge: Should objects be merged into existing objects instead of replacing them. Only a name at the end
+                      of the path merges. Missing names are added
+        :param add: Should missing objects on the way be created
+        :return: The modified document
+        """
+        # Wildcards and descents at the end of the path always replace, like they always have
+        merge = merge and isinstance(data, dict) and self.segments[-1].type == SegmentType.NAME
+        for container, key in self.targets(root, add):
+            current = container.get(key) if isinstance(container, dict) else container[key]
+            if merge and isinstance(current, dict):
+                current |= copy.deepcopy(data)
+            else:
+                container[key] = copy.deepcopy(data)
+        return root
+
+    def replace(self, root: Container, pattern: re.Pattern, replacement: str) -> Container:
+        """
+        Runs a regex substitution on every existing string that the path points to
+        :param root: The json document
+        :param pattern: The compiled pattern to replace
+        :param replacement: The replacement, which can reference groups
+        :return: The modified document
+        """
+        for container, key in self.targets(root):
+            if isinstance(container, dict) and key not in container:
+                continue
+            if isinstance(container[key], str):
+                container[key] = pattern.sub(replacement, container[key])
+        return root
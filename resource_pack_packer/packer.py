@@ -1,40 +1,70 @@
-import json
+import copy
 import logging
 import os
 import shutil
-import zipfile
+import tempfile
 from glob import glob
-from multiprocessing import pool
-from threading import Thread
 from timeit import default_timer
-from typing import Optional
+from typing import Optional, Iterable
 
 from resource_pack_packer.configs import PackInfo, parse_name_scheme_keywords, Config, RunOptions
-from resource_pack_packer.console import choose_from_list, input_log
-from resource_pack_packer.preprocessor import RPPModel, Model
+from resource_pack_packer.console import choose_from_list, input_log, add_to_logger_name
+from resource_pack_packer.patch import PatchType, PatchFile
+from resource_pack_packer.planner import BuildStep, BuildPlan, common_prefix, run_steps
+from resource_pack_packer.preprocessor import RPPModel, Model, ModelRepository, order_rpp_models, process_rpp
 from resource_pack_packer.selectors import parse_minecraft_identifier
 from resource_pack_packer.settings import MAIN_SETTINGS, parse_dir_keywords
+from resource_pack_packer.staging import PackFiles, DiskPackFiles, VirtualPackFiles
 from resource_pack_packer.util.cache import update_cache, get_cache
-from resource_pack_packer.validation import validate
-
-
-def zip_dir(src, dest):
-    if not os.path.exists(os.path.dirname(dest)):
-        os.makedirs(os.path.dirname(dest))
-
-    with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for root, dirs, files in os.walk(src):
-            for file in files:
-                zip_file.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), src))
-
-
-def minify_json(directory):
-    if directory.endswith(".json"):
-        with open(directory, "r", encoding="utf8") as json_file:
-            data = json.load(json_file)
-
-        with open(directory, "w", encoding="utf8") as json_file:
-            json.dump(data, json_file, ensure_ascii=False, indent=None)
+from resource_pack_packer.util.copier import CopyEngine
+from resource_pack_packer.util.filters import FolderFilter
+from resource_pack_packer.util.zipper import write_zip, DEFAULT_COMPRESSION_LEVEL
+from resource_pack_packer.util.patterns import pattern_cache_info
+from resource_pack_packer.util.manifest import BuildManifest, scan_files, hash_data
+from resource_pack_packer.util.watcher import Watcher
+from resource_pack_packer.util.workers import map_jobs
+from resource_pack_packer.validation import validate, ReportFormat
+
+
+def zip_dir(src, dest, compression_level: int = DEFAULT_COMPRESSION_LEVEL):
+    write_zip(DiskPackFiles(src), dest, compression_level)
+
+
+def is_rpp_model(file: str) -> bool:
+    """
+    Checks if a relative path points to a RPP model
+    :param file: Path relative to the pack
+    :return: True if the file is a RPP model
+    """
+    parts = os.path.normpath(file).split(os.sep)
+    return len(parts) >= 5 and parts[0] == "assets" and parts[2] == "models" and parts[3] == "rpp" and \
+        file.endswith(".rpp.json")
+
+
+def build_scope(pack: str, files: set) -> set:
+    """
+    Creates the scope of an incremental build
+    :param pack: The pack directory
+    :param files: Changed files relative to the pack
+    :return: The absolute paths of every changed file and the folders that contain them
+    """
+    scope = set()
+    for file in files:
+        file_path = os.path.normpath(os.path.join(pack, file))
+        while file_path not in scope and file_path != pack:
+            scope.add(file_path)
+            file_path = os.path.dirname(file_path)
+    return scope
+
+
+def _touches_pack_meta(patch_file: PatchFile) -> bool:
+    for patch in patch_file.patches:
+        if patch.type == PatchType.REPLACE.value:
+            if os.path.exists(os.path.join(parse_dir_keywords(patch.patch["directory"]), "pack.mcmeta")):
+                return True
+        elif "pack.mcmeta" in str(patch.patch):
+            return True
+    return False
 
 
 class Packer:
@@ -50,6 +80,12 @@ class Packer:
 
         self.PACK_OVERRIDE = pack is not None
 
+        self.copy_engine = CopyEngine(MAIN_SETTINGS.get_property("performance", "copy_workers"),
+                                      MAIN_SETTINGS.get_property("performance", "link_mode"))
+        # Patches that touch different files can run at the same time. Patches are mostly held back by the GIL, so they
+        # run one at a time unless more workers are set
+        self.patch_workers = MAIN_SETTINGS.get_property("performance", "patch_workers") or 1
+
         self.debugger_connected = False
 
         self.pack_info: Optional[PackInfo] = None
@@ -70,7 +106,8 @@ class Packer:
               pack_override: Optional[str] = None,
               run_option_override: Optional[int | str] = None,
               config_override: Optional[list[int | str]] = None,
-              close: Optional[bool] = None):
+              close: Optional[bool] = None,
+              watch: bool = False):
         # Pack info
         if pack_override is None:
             config_files = glob(
@@ -91,16 +128,10 @@ class Packer:
         if run_option_override is None:
             self.run_option, selected_run_option = choose_from_list(self.pack_info.run_options, "Select run option:")
         else:
-            if isinstance(run_option_override, int):
-                self.run_option = self.pack_info.run_options[run_option_override]
-            else:
-                for run_option in self.pack_info.run_options:
-                    if run_option.name == run_option_override:
-                        self.run_option = run_option
-                        break
-                if self.run_option is None:
-                    self.logger.error(f"Couldn't find run option: {run_option_override}")
-                    return
+            self.run_option = self._find_run_option(run_option_override)
+            if self.run_option is None:
+                self.logger.error(f"Couldn't find run option: {run_option_override}")
+                return
             selected_run_option = run_option_override
 
         if self.run_option.version is not None:
@@ -114,16 +145,49 @@ class Packer:
         else:
             self.configs = self.run_option.get_configs(self.pack_info.configs, self.logger, config_override)[0]
 
+        self._build_packs()
+
+        # Watch
+        if watch:
+            self._watch(selected_pack_name, selected_run_option, config_override)
+            return
+
+        # Rerun
+        if self.run_option.rerun and not close:
+            completion_input = choose_from_list(["rerun", "back"], "Waiting for input...")[0]
+            if completion_input == "rerun":
+                self.start(selected_pack_name, selected_run_option, config_override)
+
+    def _find_run_option(self, run_option: int | str) -> Optional[RunOptions]:
+        if isinstance(run_option, int):
+            if 0 <= run_option < len(self.pack_info.run_options):
+                return self.pack_info.run_options[run_option]
+            return None
+
+        for option in self.pack_info.run_options:
+            if option.name == run_option:
+                return option
+        return None
+
+    def _build_packs(self):
+        """Builds every selected config"""
+        # Packs that are about to be rebuilt are kept for incremental builds
+        if self._is_incremental():
+            kept_packs = set(map(self._get_pack_name, self.configs))
+        else:
+            kept_packs = set()
+
         # Pack
         if parse_dir_keywords(self.run_option.out_dir) == parse_dir_keywords(MAIN_SETTINGS.get_property("locations", "out")):
-            self.clear_temp()
+            if not self._is_incremental() and not self.run_option.virtual:
+                self.clear_temp()
         # Dev cache
         else:
             self.cache_dir = os.path.join(parse_dir_keywords(self.run_option.out_dir),
-                                          ".rpp", f"{os.path.basename(self.pack_dir).lower().replace(' ', '_')}.json")
+                                          ".rpp", f"{self._get_pack_slug()}.json")
 
             # Clear previous dev packs
-            for item in get_cache(self.cache_dir):
+            for item in get_cache(self.cache_dir) - kept_packs:
                 cache_pack_dir = os.path.join(parse_dir_keywords(self.run_option.out_dir), item)
 
                 if os.path.exists(cache_pack_dir):
@@ -135,158 +199,477 @@ class Packer:
         self.clear_out()
         start_time = default_timer()
 
-        if len(self.configs) > 1:
-            with pool.Pool(processes=os.cpu_count()) as p:
-                p.map(self._pack, self.configs)
-        else:
-            self._pack(self.configs[0])
+        plans = self._plan_builds(self.configs)
+        # Each job only carries its own config and shared build
+        jobs = [(config, plan.shared_steps, plan.pack_files) for plan in plans for config in plan.configs]
+        map_jobs(self._pack, jobs, star=True)
 
-        self.logger.info(f"Time: {default_timer() - start_time} Seconds")
+        # Shared builds are only needed while forking
+        self.clear_temp(os.path.join(self.TEMP_DIR, ".shared"))
 
-        # Rerun
-        if self.run_option.rerun and not close:
-            completion_input = choose_from_list(["rerun", "back"], "Waiting for input...")[0]
-            if completion_input == "rerun":
-                self.start(selected_pack_name, selected_run_option, config_override)
+        self.logger.info(f"Time: {default_timer() - start_time} Seconds")
+        self.logger.debug(f"Pattern cache: {pattern_cache_info()}")
+
+    def _get_watched_paths(self, pack_name: str) -> list[str]:
+        """
+        Gets every file and folder that affects the build
+        :param pack_name: The name of the pack's config file
+        """
+        paths = [self.pack_dir, self.PATCH_DIR,
+                 os.path.join(MAIN_SETTINGS.get_property("locations", "working_directory"), "configs", pack_name)]
+
+        for config in self.configs:
+            for patch_file in config.patches:
+                for patch in patch_file.patches:
+                    if patch.type == PatchType.REPLACE.value:
+                        paths.append(parse_dir_keywords(patch.patch["directory"]))
+        return list(dict.fromkeys(paths))
+
+    def _watch(self, pack_name: str, run_option: int | str, config_override: list[int | str]):
+        """
+        Rebuilds the selected configs whenever the pack, its patches or its config change.
+        Incremental run options only rebuild the files that changed.
+        :param pack_name: The name of the pack's config file
+        :param run_option: The selected run option
+        :param config_override: The selected configs
+        """
+        if not self._is_incremental():
+            self.logger.warning("Every change rebuilds the whole pack unless the run option is incremental")
+
+        watcher = Watcher(self._get_watched_paths(pack_name), MAIN_SETTINGS.get_property("watch", "interval"),
+                          MAIN_SETTINGS.get_property("watch", "debounce"))
+        self.logger.info(f"Watching for changes ({'native' if watcher.native else 'polling'}), "
+                         f"press Ctrl+C to stop...")
 
-    def _pack(self, config: Config):
-        pack_name = parse_name_scheme_keywords(self.pack_info.name_scheme, os.path.basename(self.pack_dir),
-                                               self.version,
-                                               config.mc_version)
+        try:
+            while True:
+                changes = watcher.wait()
+                self.logger.info(f"Detected {len(changes)} changed file(s)")
+
+                # Configs and patches are parsed when the pack info is
+                if any(not (change == self.pack_dir or change.startswith(self.pack_dir + os.sep))
+                       for change in changes):
+                    # The config might be half way through being saved
+                    try:
+                        reloaded = self._reload(pack_name, run_option, config_override)
+                    except (ValueError, KeyError) as e:
+                        self.logger.error(f"Couldn't parse pack config: {e}")
+                        reloaded = False
+                    if not reloaded:
+                        continue
+
+                    # New replace patches might need to be watched
+                    watched_paths = self._get_watched_paths(pack_name)
+                    if set(watched_paths) != set(watcher.directories):
+                        watcher.stop()
+                        watcher = Watcher(watched_paths, watcher.interval, watcher.debounce)
+
+                # A failed build is fixed by the next change
+                try:
+                    self._build_packs()
+                except Exception:
+                    self.logger.exception("Build failed")
+                self.logger.info("Waiting for changes...")
+        except KeyboardInterrupt:
+            self.logger.info("Stopped watching")
+        finally:
+            watcher.stop()
+
+    def _reload(self, pack_name: str, run_option: int | str, config_override: list[int | str]) -> bool:
+        """
+        Parses the pack's config again. The previous config is kept until the new one is valid
+        :param pack_name: The name of the pack's config file
+        :param run_option: The selected run option
+        :param config_override: The selected configs
+        :return: True if the new config is used
+        """
+        pack_info = PackInfo.parse(pack_name)
+        if pack_info is None:
+            return False
+
+        previous_pack_info = self.pack_info
+        self.pack_info = pack_info
+        selected_run_option = self._find_run_option(run_option)
+        if selected_run_option is None:
+            self.logger.error(f"Couldn't find run option: {run_option}")
+            self.pack_info = previous_pack_info
+            return False
+
+        self.run_option = selected_run_option
+        self.configs = self.run_option.get_configs(self.pack_info.configs, self.logger, config_override)[0]
+        return True
+
+    def __getstate__(self):
+        # Workers are sent the packer with every job, so only what a single config's build needs is kept
+        state = self.__dict__.copy()
+        state["configs"] = None
+
+        if self.pack_info is not None:
+            pack_info = copy.copy(self.pack_info)
+            pack_info.configs = []
+            pack_info.run_options = []
+            state["pack_info"] = pack_info
+        return state
+
+    def _is_incremental(self) -> bool:
+        # Virtual packs have no staging folder to reuse
+        return self.run_option.incremental and not self.run_option.virtual
+
+    def _get_pack_slug(self) -> str:
+        return os.path.basename(self.pack_dir).lower().replace(' ', '_')
+
+    def _get_pack_name(self, config: Config) -> str:
+        return parse_name_scheme_keywords(self.pack_info.name_scheme, os.path.basename(self.pack_dir), self.version,
+                                          config.mc_version)
+
+    def _get_manifest_path(self, temp_pack_dir: str, config: Config) -> str:
+        return os.path.join(os.path.dirname(temp_pack_dir), ".rpp",
+                            f"{self._get_pack_slug()}.{config.name.lower().replace(' ', '_')}.manifest.json")
+
+    def _hash_inputs(self, config: Config, manifest: BuildManifest) -> str:
+        """
+        Hashes everything besides the pack's files that affects the output of a config
+        :param config: The config being built
+        :param manifest: The manifest of the previous build. Its overlays are updated
+        :return: The hash of every input
+        """
+        overlays = {}
+        for patch_file in config.patches:
+            for patch in patch_file.patches:
+                if patch.type == PatchType.REPLACE.value:
+                    overlay_dir = parse_dir_keywords(patch.patch["directory"])
+                    overlays[overlay_dir] = scan_files(overlay_dir, manifest.overlays.get(overlay_dir))
+        manifest.overlays = overlays
+
+        return hash_data({
+            "description": self.pack_info.description,
+            "block_files": self.pack_info.block_files,
+            "pack_format": config.pack_format,
+            "delete_textures": config.delete_textures,
+            "ignore_textures": config.ignore_textures,
+            "delete_empty_folders": config.delete_empty_folders,
+            "minify_json": config.minify_json and self.run_option.minify_json,
+            "patches": [[patch_file.name, [[patch.type, patch.patch] for patch in patch_file.patches]]
+                        for patch_file in config.patches],
+            "overlays": {overlay_dir: {file: entry[2] for file, entry in files.items()}
+                         for overlay_dir, files in overlays.items()}
+        })
+
+    def _pack(self, config: Config, shared_steps: int = 0, shared_pack_files: Optional[PackFiles] = None):
+        """
+        Builds a single config
+        :param config: The config to build
+        :param shared_steps: The amount of build steps that have already been run on 'shared_pack_files'
+        :param shared_pack_files: A shared build to continue from
+        """
+        pack_name = self._get_pack_name(config)
         logger = logging.getLogger(f"{os.path.basename(self.pack_dir)}\x1b[0m/\x1b[34m{config.name}\x1b[0m")
 
         temp_pack_dir = os.path.join(self.TEMP_DIR, pack_name)
+        dev_pack = parse_dir_keywords(self.run_option.out_dir) != parse_dir_keywords(MAIN_SETTINGS.get_property("locations", "out"))
 
         # Overrides output
-        if parse_dir_keywords(self.run_option.out_dir) != parse_dir_keywords(MAIN_SETTINGS.get_property("locations", "out")):
+        if dev_pack:
             temp_pack_dir = os.path.join(parse_dir_keywords(self.run_option.out_dir), pack_name)
-            self.clear_temp(temp_pack_dir)
-
-        # Copy Files
-        logger.info("Copying...")
-        Packer._copy_pack(self.pack_dir, temp_pack_dir)
-
-        # Delete Textures
-        if config.delete_textures:
-            logger.info("Deleting textures...")
-            Packer.delete(temp_pack_dir, "textures", config.ignore_textures, logger)
 
-        # Generate Meta
-        with open(os.path.join(temp_pack_dir, "pack.mcmeta"), "w") as file:
-            meta = {
-                "pack": {
-                    "pack_format": config.pack_format,
-                    "description": self.pack_info.description
-                }
-            }
-            if config.minify_json and self.run_option.minify_json:
-                indent = None
+        # Incremental build
+        manifest = None
+        scope = None
+        copy_files = None
+        if self._is_incremental():
+            manifest = BuildManifest.load(self._get_manifest_path(temp_pack_dir, config))
+            inputs = self._hash_inputs(config, manifest)
+            source_files = scan_files(self.pack_dir, manifest.files)
+
+            if manifest.is_reusable(temp_pack_dir, inputs):
+                changed, removed = manifest.diff(source_files)
+                dirty = changed | removed
+
+                # Models can be used by any RPP model
+                if any(os.path.normpath(file).split(os.sep)[2:3] == ["models"] for file in dirty):
+                    dirty |= set(filter(is_rpp_model, source_files))
+
+                # Remove outdated files. RPP models can replace source models, which are copied again
+                stale_outputs, replaced = manifest.pop_outputs(dirty, source_files)
+                for file in removed | stale_outputs:
+                    if os.path.isfile(os.path.join(temp_pack_dir, file)):
+                        os.remove(os.path.join(temp_pack_dir, file))
+                dirty |= replaced
+
+                copy_files = dirty - removed
+                scope = build_scope(temp_pack_dir, dirty)
+                logger.info(f"Incremental build: {len(changed)} changed, {len(removed)} removed")
             else:
-                indent = 2
-            json.dump(meta, file, ensure_ascii=False, indent=indent)
-
-        # Patch
-        if len(config.patches) > 0:
-            logger.info(f"Applying patches...")
+                manifest.outputs = {}
 
-            for patch in config.patches:
-                patch.run(temp_pack_dir, logger.name, self.pack_info, config)
+            manifest.staging = temp_pack_dir
+            manifest.inputs = inputs
+            manifest.files = source_files
+            # The staging folder is only valid once the build completes
+            manifest.invalidate()
 
-        # Preprocessors
-        rpp_models = glob(os.path.join(temp_pack_dir, "assets", "*", "models", "rpp", "**"), recursive=True)
+        if scope is None and (dev_pack or self._is_incremental() or self.run_option.virtual):
+            self.clear_temp(temp_pack_dir)
 
-        # Remove folders and non-json files
-        parsed_rpp_models = list(filter(lambda m: True if os.path.isfile(m) and m.endswith(".rpp.json") else None,
-                                        rpp_models))
-        if len(parsed_rpp_models):
-            logger.info("Running preprocessors...")
+        minify = config.minify_json and self.run_option.minify_json
 
-            for i, model in enumerate(parsed_rpp_models, start=1):
-                processed_model, identifier = RPPModel.parse_file(model).process(temp_pack_dir)
-                Model.save(processed_model,
-                           os.path.join(temp_pack_dir, parse_minecraft_identifier(identifier, "models", "json")))
-                os.remove(model)
-                logger.info(f"Processed model [{i}/{len(parsed_rpp_models)}]")
+        # Virtual packs are never written to the temp folder
+        if self.run_option.virtual and shared_steps > 0:
+            pack_files = shared_pack_files.fork(temp_pack_dir)
+        elif self.run_option.virtual:
+            pack_files = VirtualPackFiles.from_directory(self.pack_dir, temp_pack_dir, minify,
+                                                         self._get_source_files(config, logger))
+        else:
+            pack_files = DiskPackFiles(temp_pack_dir, minify, self.copy_engine)
+
+        if scope is not None and len(scope) == 0:
+            logger.info("Pack is up to date")
+        elif shared_steps > 0:
+            # Continue from the shared build. Linked files are replaced, never edited, by later steps
+            if isinstance(pack_files, DiskPackFiles):
+                logger.info("Forking shared build...")
+                copy_stats = self.copy_engine.copy_tree(shared_pack_files.root, temp_pack_dir, link=True)
+                logger.info(f"Forked {copy_stats}")
+
+            self._build(config, pack_files, logger, manifest, scope, shared_steps)
+        else:
+            # Copy Files
+            if isinstance(pack_files, DiskPackFiles):
+                files = self._get_source_files(config, logger, copy_files)
+                logger.info("Copying...")
+                copy_stats = pack_files.copy_from(self.pack_dir, files)
+                logger.info(f"Copied {copy_stats}")
 
-        # Minify Json
-        if config.minify_json and self.run_option.minify_json:
-            logger.info("Minifying json files...")
-            Packer.minify_json_files(temp_pack_dir)
+            self._build(config, pack_files, logger, manifest, scope)
 
-        # Delete Empty Folders
-        if config.delete_empty_folders:
-            directories = glob(os.path.join(temp_pack_dir, "**"), recursive=True)
-
-            for directory in directories:
-                if os.path.isdir(directory) and os.path.exists(directory):
-                    if len(glob(os.path.join(directory, "**"), recursive=True)) == 1:
-                        os.remove(directory)
+        if manifest is not None:
+            manifest.save()
 
         # Zip
         if self.run_option.zip_pack:
             output = os.path.normpath(os.path.join(self.OUT_DIR, pack_name + ".zip"))
-            zip_dir(temp_pack_dir, output)
+            write_zip(pack_files, output, self.run_option.compression_level)
             logger.info(f"Completed pack: {output}")
-        elif self.run_option.out_dir == "#packdir":
+        else:
+            if isinstance(pack_files, VirtualPackFiles):
+                pack_files.materialize(temp_pack_dir, self.copy_engine)
 
-            update_cache(pack_name, self.cache_dir)
+            if self.run_option.out_dir == "#packdir":
+                update_cache(pack_name, self.cache_dir)
 
         if self.run_option.validate:
             logger.info(f"Validating...")
-            validate(temp_pack_dir, logger.name)
+            if os.path.isdir(temp_pack_dir):
+                self._validate(temp_pack_dir, pack_name, logger)
+            else:
+                # Zipped virtual packs are never written to a folder, so only their json is written for validation
+                with tempfile.TemporaryDirectory(prefix="rpp-") as validation_dir:
+                    validation_pack_dir = os.path.join(validation_dir, pack_name)
+                    pack_files.materialize(validation_pack_dir, self.copy_engine, "json")
+                    self._validate(validation_pack_dir, pack_name, logger)
+
+    def _validate(self, pack: str, pack_name: str, logger: logging.Logger):
+        """
+        Validates a built pack and writes its report
+        :param pack: The folder of the built pack
+        :param pack_name: The name of the pack
+        :param logger: The logger of the config
+        """
+        report_format = self.run_option.validation_report
+        if report_format is not None:
+            extension = ReportFormat.get_extension(report_format)
+            report = os.path.join(self.OUT_DIR, f"{pack_name}.validation.{extension}")
+            validate(pack, logger.name, report, report_format)
+        else:
+            validate(pack, logger.name)
+
+    def _get_steps(self, config: Config, manifest: Optional[BuildManifest] = None,
+                   scope: Optional[set] = None) -> list[BuildStep]:
+        """
+        Gets every step of a config's build, besides copying, deleting textures and generating the pack meta
+        :param config: The config being built
+        :param manifest: The manifest of an incremental build
+        :param scope: The absolute paths that need to be rebuilt. If None, then everything is rebuilt
+        :return: The steps in the order they are run
+        """
+        steps = []
 
-    @staticmethod
-    def _copy_pack(src: str, dest: str):
-        files = glob(os.path.join(src, "**"), recursive=True)
+        # Patch
+        for patch_file in config.patches:
+            def run_patch(pack_files: PackFiles, logger: logging.Logger, patch_file=patch_file):
+                logger.info(f"Applying patch: {patch_file.name}")
+                patch_file.run(pack_files, logger.name, self.pack_info, config, scope)
+
+            # Patches that edit the pack meta have to run after it is generated
+            if _touches_pack_meta(patch_file):
+                signature = None
+            else:
+                signature = ("patch", patch_file.name,
+                             hash_data([[patch.type, patch.patch] for patch in patch_file.patches]))
+            steps.append(BuildStep(signature, run_patch,
+                                   lambda pack_files, patch_file=patch_file:
+                                   patch_file.footprint(pack_files, self.pack_info)))
 
-        copy_threads = []
+        # Preprocessors
+        steps.append(BuildStep(("preprocess",),
+                               lambda pack_files, logger: self._preprocess(pack_files, logger, manifest, scope)))
+        return steps
+
+    def _build(self, config: Config, pack_files: PackFiles, logger: logging.Logger,
+               manifest: Optional[BuildManifest], scope: Optional[set], shared_steps: int = 0):
+        """
+        Runs every build step on a pack that has already been copied
+        :param config: The config being built
+        :param pack_files: The files of the pack being built
+        :param logger: The config's logger
+        :param manifest: The manifest of an incremental build
+        :param scope: The absolute paths that need to be rebuilt. If None, then everything is rebuilt
+        :param shared_steps: The amount of steps that have already been run on the pack by a shared build
+        """
+        # Generate Meta
+        # Comes after the shared steps, since it is different for every config
+        meta = {
+            "pack": {
+                "pack_format": config.pack_format,
+                "description": self.pack_info.description
+            }
+        }
+        pack_files.write_json(os.path.join(pack_files.root, "pack.mcmeta"), meta, 2)
 
-        for file in files:
-            if os.path.isfile(file):
-                thread = Thread(target=Packer._copy_file, args=[src, dest, file])
-                copy_threads.append(thread)
-                thread.start()
+        run_steps(self._get_steps(config, manifest, scope)[shared_steps:], pack_files, logger, self.patch_workers)
 
-        for thread in copy_threads:
-            thread.join()
+        # Json is only serialized once, in its final style
+        pack_files.flush()
 
-    @staticmethod
-    def _copy_file(src, dest, file):
-        file_dest = file.replace(src, dest)
+        # Delete Empty Folders
+        if config.delete_empty_folders:
+            start_time = default_timer()
+            removed = pack_files.delete_empty_folders()
+            logger.info(f"Deleted {removed} empty folders in {default_timer() - start_time:.2f}s")
 
-        try:
-            shutil.copy(file, file_dest)
-        except IOError:
-            try:
-                os.makedirs(os.path.dirname(file_dest))
-            except FileExistsError:
-                pass
-            shutil.copy(file, file_dest)
+    def _preprocess(self, pack_files: PackFiles, logger: logging.Logger, manifest: Optional[BuildManifest],
+                    scope: Optional[set]):
+        temp_pack_dir = pack_files.root
 
-    @staticmethod
-    def delete(directory, folder, ignore, logger: logging.Logger):
-        namespaces = glob(os.path.join(directory, "assets", "*"))
+        rpp_models = pack_files.glob(os.path.join(temp_pack_dir, "assets", "*", "models", "rpp", "**"),
+                                     recursive=True)
 
-        for i, namespace in enumerate(namespaces, start=1):
-            if os.path.exists(os.path.join(namespace, folder)):
-                folders = glob(os.path.join(namespace, folder, "*"))
+        # Remove folders and non-json files
+        parsed_rpp_models = list(filter(lambda m: True if pack_files.isfile(m) and m.endswith(".rpp.json") else None,
+                                        rpp_models))
+        if len(parsed_rpp_models):
+            logger.info("Running preprocessors...")
+            start_time = default_timer()
+
+            # Shared by every rpp model, so models and their parents are only parsed once
+            models = ModelRepository(pack_files)
+            rpp_data = {model: pack_files.read_json(model) for model in parsed_rpp_models}
+            rpp_models = {model: RPPModel.parse(data) for model, data in rpp_data.items()}
+            groups = order_rpp_models(rpp_models, models)
+
+            timings = []
+            for i, group in enumerate(groups, start=1):
+                # Models in a group don't read each other's output, so they are processed in parallel
+                jobs = [(temp_pack_dir, rpp_data[model], models.inputs(rpp_models[model].references()))
+                        for model in group]
+                for model, (processed, seconds) in zip(group, map_jobs(process_rpp, jobs, star=True)):
+                    output = parse_minecraft_identifier(rpp_models[model].identifier, "models", "json")
+                    parent, textures, elements, display, geometry = processed
+                    models.save(Model(parent, textures, elements, display, models, geometry=geometry),
+                                os.path.join(temp_pack_dir, output))
+                    pack_files.remove(model)
+                    timings.append((seconds, model))
+                    logger.debug(f"Processed model in {seconds:.4f} seconds: {model}")
+
+                    if manifest is not None:
+                        manifest.outputs[os.path.relpath(model, temp_pack_dir)] = output
+                    if scope is not None:
+                        scope |= build_scope(temp_pack_dir, {output})
+                logger.info(f"Processed models [{len(timings)}/{len(parsed_rpp_models)}] in stage [{i}/{len(groups)}]")
+
+            slowest_seconds, slowest = max(timings)
+            logger.info(f"Processed {len(timings)} models in {default_timer() - start_time} seconds. Slowest took "
+                        f"{slowest_seconds:.4f} seconds: {os.path.relpath(slowest, temp_pack_dir)}")
 
-                for fold in folders:
-                    delete_files = True
-                    for ig in ignore:
-                        if os.path.basename(fold) == ig.lower():
-                            delete_files = False
+    @staticmethod
+    def _get_texture_filter(config: Config) -> Optional[FolderFilter]:
+        if not config.delete_textures:
+            return None
+        return FolderFilter("textures", config.ignore_textures)
+
+    def _get_source_files(self, config: Config, logger: logging.Logger,
+                          files: Optional[Iterable[str]] = None) -> list[str]:
+        """
+        Gets the files of the pack that a config starts with. Deleted textures are filtered out before copying, so
+        they are never read or written
+        :param config: The config being built
+        :param logger: The config's logger
+        :param files: Files relative to the pack. If None, then every file in the pack is used
+        :return: Files relative to the pack
+        """
+        if files is None:
+            files = CopyEngine.walk(self.pack_dir)
+        files = list(files)
+
+        texture_filter = self._get_texture_filter(config)
+        if texture_filter is None:
+            return files
+
+        kept_files = texture_filter.filter(files)
+        logger.info(f"Deleted {len(files) - len(kept_files)} textures")
+        return kept_files
+
+    def _plan_builds(self, configs: list[Config]) -> list[BuildPlan]:
+        """
+        Groups configs that start with the same build steps and runs those steps once for each group
+        :param configs: The configs being built
+        :return: The plans that build every config
+        """
+        # Incremental builds reuse each config's own staging folder instead
+        if self._is_incremental() or len(configs) < 2:
+            return [BuildPlan(configs)]
+
+        # Json style and deleted textures are decided when files are copied, so only configs that copy the same
+        # files in the same style can share a copy
+        groups: dict[tuple, list[Config]] = {}
+        for config in configs:
+            texture_filter = self._get_texture_filter(config)
+            key = (config.minify_json and self.run_option.minify_json,
+                   texture_filter.signature if texture_filter is not None else None)
+            groups.setdefault(key, []).append(config)
+
+        plans = []
+        for (minify, _), group in groups.items():
+            shared_steps = common_prefix(list(map(self._get_steps, group)))
+
+            if len(group) < 2 or shared_steps == 0:
+                plans.append(BuildPlan(group))
+                continue
+
+            logger = add_to_logger_name(self.logger.name, "shared")
+            logger.info(f"Sharing {shared_steps} build steps between: {', '.join(config.name for config in group)}")
+
+            shared_dir = os.path.join(self.TEMP_DIR, ".shared", str(len(plans)))
+            files = self._get_source_files(group[0], logger)
+            if self.run_option.virtual:
+                pack_files = VirtualPackFiles.from_directory(self.pack_dir, shared_dir, minify, files)
+            else:
+                self.clear_temp(shared_dir)
+                pack_files = DiskPackFiles(shared_dir, minify, self.copy_engine)
+                logger.info("Copying...")
+                logger.info(f"Copied {pack_files.copy_from(self.pack_dir, files)}")
 
-                    if delete_files:
-                        shutil.rmtree(fold)
-                logger.info(f"Deleted texture [{i}/{len(namespaces)}]: {os.path.basename(namespace)}")
+            run_steps(self._get_steps(group[0])[:shared_steps], pack_files, logger, self.patch_workers)
+            pack_files.flush()
 
-    @staticmethod
-    def minify_json_files(temp_pack_dir):
-        files = glob(os.path.join(temp_pack_dir, "**"), recursive=True)
+            # Only what the configs need is sent to the build processes
+            if isinstance(pack_files, VirtualPackFiles):
+                pack_files = pack_files.fork(shared_dir)
+            else:
+                pack_files = DiskPackFiles(shared_dir, minify, self.copy_engine)
 
-        for file in files:
-            minify_json(file)
+            plans.append(BuildPlan(group, shared_steps, pack_files))
+        return plans
 
     def clear_temp(self, directory=None):
         """Clears the temp folder"""
@@ -1,17 +1,25 @@
 import json
 import logging
+import math
 import os
 import random
-import re
-import shutil
 from enum import Enum
-from glob import glob
 from os import path
 
-from typing import List, Union, Tuple
+from typing import List, Union, Tuple, Optional
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from resource_pack_packer.jsonpath import JsonPath
 from resource_pack_packer.selectors import FileSelector, Direction
 from resource_pack_packer.settings import parse_dir_keywords
+from resource_pack_packer.staging import PackFiles
+from resource_pack_packer.util.copier import CopyEngine
+from resource_pack_packer.util.patterns import compile_regex, precompile
+from resource_pack_packer.util.workers import map_jobs
 
 
 def check_option(root, option):
@@ -21,6 +29,19 @@ def check_option(root, option):
         return False
 
 
+def _in_scope(pack: str, file: str, scope: Optional[set]) -> bool:
+    """
+    Checks if a file should be patched
+    :param pack: The pack directory
+    :param file: A file or folder selected by a patch
+    :param scope: The absolute paths that should be patched. If None, then everything is patched
+    :return: True if the file should be patched
+    """
+    if scope is None:
+        return True
+    return path.normpath(path.join(pack, file)) in scope
+
+
 class PatchType(Enum):
     REPLACE = "replace"
     REMOVE = "remove"
@@ -36,33 +57,75 @@ class Patch:
         self.pack_info = None
         self.config = None
 
-    def run(self, pack: str, logger: logging.Logger, pack_info, config):
+        # Patterns are compiled while loading, so patching never has to
+        precompile(self.patch)
+
+    def run(self, pack: PackFiles, logger: logging.Logger, pack_info, config, scope: Optional[set] = None):
         self.pack_info = pack_info
         self.config = config
         match self.type:
             case PatchType.REPLACE.value:
-                _patch_replace(pack, self, logger)
+                _patch_replace(pack, self, logger, scope)
             case PatchType.REMOVE.value:
-                _patch_remove(pack, pack_info, self, logger)
+                _patch_remove(pack, pack_info, self, logger, scope)
             case PatchType.MIXIN_JSON.value:
-                _patch_mixin_json(pack, pack_info, self, logger)
+                _patch_mixin_json(pack, pack_info, self, logger, scope)
             case PatchType.MODIFIER.value:
-                _patch_modifier(pack, pack_info, self, logger)
+                _patch_modifier(pack, pack_info, self, logger, scope)
             case _:
                 logger.error(f"Incorrect patch type: {self.type}")
 
+    def footprint(self, pack: PackFiles, pack_info) -> Optional[List[str]]:
+        """
+        Finds every file or folder that the patch could read or write
+        :param pack: The pack being patched
+        :param pack_info: The pack's info
+        :return: Paths relative to the pack. Folders include everything in them. If None, then the patch could touch
+                 anything
+        """
+        match self.type:
+            case PatchType.REPLACE.value:
+                patch_dir = parse_dir_keywords(self.patch["directory"])
+                return list(CopyEngine.walk(patch_dir)) if path.isdir(patch_dir) else []
+            case PatchType.REMOVE.value:
+                return FileSelector.parse(self.patch["file_selector"], pack).footprint(pack_info)
+            case PatchType.MIXIN_JSON.value:
+                files = []
+                for mixin in self.patch["mixins"]:
+                    mixin_files = FileSelector.parse(mixin["file_selector"], pack).footprint(pack_info)
+                    if mixin_files is None:
+                        return None
+                    files += mixin_files
+                return files
+            case PatchType.MODIFIER.value if self.patch["type"] == ModifierType.MODEL_MARGIN.value:
+                return FileSelector.parse(self.patch["arguments"]["file_selector"], pack).footprint(pack_info)
+            case _:
+                return None
+
 
 class PatchFile:
     def __init__(self, patches: List[Patch], name: str):
         self.patches = patches
         self.name = name
 
-    def run(self, pack: str, logger_name: str, pack_info, config):
+    def run(self, pack: PackFiles, logger_name: str, pack_info, config, scope: Optional[set] = None):
         for i, patch in enumerate(self.patches, start=1):
             logger = logging.getLogger(f"{logger_name}\x1b[0m/\x1b[34m{self.name}\x1b[0m")
-            patch.run(pack, logger, pack_info, config)
+            patch.run(pack, logger, pack_info, config, scope)
             logger.info(f"Completed patch [{i}/{len(self.patches)}]")
 
+    def footprint(self, pack: PackFiles, pack_info) -> Optional[List[str]]:
+        """
+        Finds every file or folder that any of the patches could read or write. See 'Patch.footprint'
+        """
+        files = []
+        for patch in self.patches:
+            patch_files = patch.footprint(pack, pack_info)
+            if patch_files is None:
+                return None
+            files += patch_files
+        return files
+
     @staticmethod
     def parse_file(directory: str, name: str, logger: logging.Logger):
         if os.path.exists(directory):
@@ -80,145 +143,42 @@ class PatchFile:
 
 
 # Replaces and adds files accordingly
-def _patch_replace(pack, patch, logger: logging.Logger):
+def _patch_replace(pack: PackFiles, patch, logger: logging.Logger, scope: Optional[set] = None):
     patch_dir = parse_dir_keywords(patch.patch["directory"])
-    patch_files = glob(path.join(patch_dir, "**"), recursive=True)
+    if not path.isdir(patch_dir):
+        return
 
-    for file in patch_files:
+    # The overlay is walked once and added in one batch, so folders are created once and files are linked in parallel
+    files = []
+    for file in CopyEngine.walk(patch_dir):
         # The location that the file should go to
-        pack_file = file.replace(patch_dir, pack)
-
-        # Removes all files in pack that are in the patch.py
-        if path.isfile(pack_file) and path.exists(pack_file):
-            os.remove(pack_file)
-
-        # Applies patch.py
-        if path.isfile(file) and path.exists(file):
-            try:
-                shutil.copy(file, pack_file)
-            except IOError:
-                os.makedirs(path.dirname(pack_file))
-                shutil.copy(file, pack_file)
-
+        pack_file = path.join(pack.root, file)
+        if _in_scope(pack.root, pack_file, scope):
+            files.append((pack_file, path.join(patch_dir, file)))
 
-def _remove_block(file):
-    if path.exists(file):
-        os.remove(file)
+    overridden = pack.add_files(files)
+    logger.info(f"Replaced {len(overridden)} files and added {len(files) - len(overridden)} files")
 
 
 # Removes all specified files
-def _patch_remove(pack, pack_info, patch, logger: logging.Logger):
+def _patch_remove(pack: PackFiles, pack_info, patch, logger: logging.Logger, scope: Optional[set] = None):
     selector = FileSelector(patch.patch["file_selector"]["type"], patch.patch["file_selector"]["arguments"], pack)
     files = selector.run(pack_info, logger)
 
-    filtered_files = []
-    for file in files:
-        if os.path.exists(file):
-            filtered_files.append(file)
-
-    for i, file in enumerate(filtered_files, start=1):
-        # Removes file
-        if path.isfile(file):
-            os.remove(file)
-            logger.info(f"Removed file [{i}/{len(filtered_files)}]: {file}")
-        # Removes folder
-        else:
-            shutil.rmtree(file)
-            logger.info(f"Removed folder [{i}/{len(filtered_files)}]: {file}")
-
-
-def _get_json_file(file_dir: str) -> dict:
-    if path.isfile(file_dir) and path.exists(file_dir):
-        with open(file_dir, "r") as file:
-            return json.load(file)
+    selected = [path.join(pack.root, file) for file in files if _in_scope(pack.root, file, scope)]
+    removed = pack.remove_files(selected)
+    for file in removed:
+        logger.debug(f"Removed file: {file}")
+    logger.info(f"Removed {len(removed)} files selected by {len(selected)} paths")
 
 
-def _set_json_file(file_dir: str, data: dict):
-    if path.isfile(file_dir) and path.exists(file_dir):
-        with open(file_dir, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent="\t")
+def _get_json_file(pack: PackFiles, file_dir: str) -> dict:
+    return pack.read_json(file_dir)
 
 
-def _set_json(root: Union[list, dict], location: list, data, merge: bool, add: bool) -> dict:
-    if len(location) > 1:
-        if location[0] == "*":
-            if isinstance(root, dict):
-                for key in root.keys():
-                    root[key] = _set_json(root[key], location[1:], data, merge, add)
-            elif isinstance(root, list):
-                for i in range(len(root)):
-                    root[i] = _set_json(root[i], location[1:], data, merge, add)
-        else:
-            if location[0] in root:
-                root[location[0]] = _set_json(root[location[0]], location[1:], data, merge, add)
-            elif add:
-                # If the location does not exist, then it won't attempt a merge (faster).
-                new_json = data
-
-                location.reverse()
-
-                for key in location:
-                    new_json = {key: new_json}
-
-                root |= new_json
-    else:
-        if location[0] == "*":
-            if isinstance(root, dict):
-                for key in root.keys():
-                    root[key] = data
-            elif isinstance(root, list):
-                for i in range(len(root)):
-                    root[i] = data
-        else:
-            if merge and isinstance(data, dict) and isinstance(root[location[0]], dict):
-                root[location[0]] |= data
-            else:
-                root[location[0]] = data
-    return root
-
-
-def _replace_json(root: Union[list, dict], location: list, select: str, replacement: str) -> dict:
-    if len(location) > 1:
-        if location[0] == "*":
-            if isinstance(root, dict):
-                for key in root.keys():
-                    root[key] = _replace_json(root[key], location[1:], select, replacement)
-            elif isinstance(root, list):
-                for i in range(len(root)):
-                    root[i] = _replace_json(root[i], location[1:], select, replacement)
-        else:
-            # Checks if the key exits
-            if location[0] in root:
-                root[location[0]] = _replace_json(root[location[0]], location[1:], select, replacement)
-    else:
-        if location[0] == "*":
-            if isinstance(root, dict):
-                for key, value in root.items():
-                    root[key] = re.sub(select, replacement, value)
-            elif isinstance(root, list):
-                for value, i in iter(root):
-                    root[i] = re.sub(select, replacement, value)
-        elif isinstance(root, dict):
-            root[location[0]] = re.sub(select, replacement, root[location[0]])
-    return root
-
-
-def _check_json_node(root: dict, location: list) -> bool:
-    # For the case that we have an empty element
-    if root is None:
-        return False
-
-    # Check existence of the first key
-    if location[0] in root:
-
-        # if this is the last key in the list, then no need to look further
-        if len(location) == 1:
-            return True
-        else:
-            next_value = location[1:len(location)]
-            return _check_json_node(root[location[0]], next_value)
-    else:
-        return False
+def _set_json_file(pack: PackFiles, file_dir: str, data: dict):
+    if pack.isfile(file_dir):
+        pack.write_json(file_dir, data, "\t")
 
 
 class MixinSelectorType(Enum):
@@ -230,10 +190,15 @@ class MixinSelector:
         self.selector_type = selector_type
         self.arguments = arguments
 
-    def run(self, json_data, logger: logging.Logger) -> Union[list, None]:
+        # Compiled once, then used on every file
         if self.selector_type == MixinSelectorType.PATH.value:
-            location = str(self.arguments["location"]).split("/")
-            return location
+            self.path = JsonPath(str(self.arguments["location"]))
+        else:
+            self.path = None
+
+    def run(self, json_data, logger: logging.Logger) -> Optional[JsonPath]:
+        if self.path is not None:
+            return self.path
         else:
             logger.error(f"Incorrect selector type: {self.selector_type}")
 
@@ -252,7 +217,14 @@ class MixinModifier:
         self.modifier_type = modifier_type
         self.arguments = arguments
 
-    def run(self, file_directory: str, file: dict, json_directory: list, logger: logging.Logger):
+    def run(self, file: dict, json_path: JsonPath, logger: logging.Logger) -> dict:
+        """
+        Modifies a json file. The file isn't saved
+        :param file: The file's json
+        :param json_path: The location in the json to modify
+        :param logger: The patch's logger
+        :return: The modified json
+        """
         modified_file = file
 
         match self.modifier_type:
@@ -263,15 +235,16 @@ class MixinModifier:
 
                 add = True
                 if "add" in self.arguments:
-                    merge = self.arguments["add"]
+                    add = self.arguments["add"]
 
-                modified_file = _set_json(file, json_directory, self.arguments["data"], merge, add)
+                modified_file = json_path.set(file, self.arguments["data"], merge, add)
             case MixinModifierType.REPLACE.value:
-                modified_file = _replace_json(file, json_directory, self.arguments["select"], self.arguments["replacement"])
+                modified_file = json_path.replace(file, compile_regex(self.arguments["select"]),
+                                                  self.arguments["replacement"])
             case _:
                 logger.error(f"Incorrect modifier type: {self.modifier_type}")
 
-        _set_json_file(file_directory, modified_file)
+        return modified_file
 
     @staticmethod
     def parse(data: list):
@@ -280,43 +253,71 @@ class MixinModifier:
 
 class Mixin:
     def __init__(self, file_selector: FileSelector, selector: MixinSelector, modifiers: List[MixinModifier],
-                 pack: str):
+                 pack: PackFiles):
         self.file_selector = file_selector
         self.selector = selector
         self.modifiers = modifiers
         self.pack = pack
 
-    def run(self, pack_info, logger):
-        files = self.file_selector.run(pack_info, logger)
-        for file in files:
-            file_path = os.path.join(self.pack, file)
-            file_data = _get_json_file(file_path)
-
-            # Checks if file exists
-            if file_data is None:
-                logger.warning(f"File couldn't be found: {file_path}")
-                continue
-
-            json_directory = self.selector.run(file_data, logger)
-
-            for modifier in self.modifiers:
-                modifier.run(file_path, file_data, json_directory, logger)
+    def select(self, pack_info, logger, scope: Optional[set] = None) -> List[str]:
+        """
+        Finds the files that the mixin modifies
+        :return: The absolute paths of the files
+        """
+        files = []
+        for file in self.file_selector.run(pack_info, logger):
+            file_path = os.path.normpath(os.path.join(self.pack.root, file))
+            if _in_scope(self.pack.root, file_path, scope):
+                files.append(file_path)
+        return files
+
+    def apply(self, file_data: dict, logger) -> dict:
+        """
+        Runs every modifier on a file. The file isn't saved
+        :param file_data: The file's json
+        :param logger: The patch's logger
+        :return: The modified json
+        """
+        json_path = self.selector.run(file_data, logger)
+        if json_path is None:
+            return file_data
+
+        for modifier in self.modifiers:
+            file_data = modifier.run(file_data, json_path, logger)
+        return file_data
 
     @staticmethod
-    def parse(data: dict, pack: str):
+    def parse(data: dict, pack: PackFiles):
         return Mixin(FileSelector.parse(data["file_selector"], pack),
                      MixinSelector.parse(data["selector"]),
                      MixinModifier.parse(data["modifiers"]), pack)
 
 
 # Allows json files to be edited
-def _patch_mixin_json(pack: str, pack_info, patch: Patch, logger: logging.Logger):
-    mixins = patch.patch["mixins"]
+def _patch_mixin_json(pack: PackFiles, pack_info, patch: Patch, logger: logging.Logger, scope: Optional[set] = None):
+    mixins = list(map(lambda m: Mixin.parse(m, pack), patch.patch["mixins"]))
+
+    # File -> every mixin that modifies it, in the order they are applied
+    targets: dict[str, List[Mixin]] = {}
+    for mixin in mixins:
+        for file_path in mixin.select(pack_info, logger, scope):
+            targets.setdefault(file_path, []).append(mixin)
+
+    # Each file is loaded and saved once, no matter how many mixins modify it
+    for file_path, file_mixins in targets.items():
+        file_data = _get_json_file(pack, file_path)
 
-    for i, data in enumerate(mixins, start=1):
-        mixin = Mixin.parse(data, pack)
-        logger.info(f"Completed mixin [{i}/{len(mixins)}]")
-        mixin.run(pack_info, logger)
+        # Checks if file exists
+        if file_data is None:
+            logger.warning(f"File couldn't be found: {file_path}")
+            continue
+
+        for mixin in file_mixins:
+            file_data = mixin.apply(file_data, logger)
+
+        _set_json_file(pack, file_path, file_data)
+
+    logger.info(f"Completed {len(mixins)} mixins on {len(targets)} files")
 
 
 def get_cube_direction(from_pos: Tuple[int], to_pos: Tuple[int]) -> Union[str, None]:
@@ -351,7 +352,146 @@ class ModifierType(Enum):
     MODEL_MARGIN = "model_margin"
 
 
-def _patch_modifier(pack: str, pack_info, patch: Patch, logger: logging.Logger):
+# Least amount of models moved by one worker. Smaller chunks cost more to send to a worker than to move
+MARGIN_CHUNK_SIZE = 64
+
+
+def _margin_offsets(seed, model: str, elements: int, offset: float, random_offset: float) -> List[float]:
+    """
+    Draws every random offset of a model at once. Each model gets its own random stream, so a model gets the same
+    margin no matter which other models are selected or rebuilt, or which backend is used
+    :param seed: The patch's seed
+    :param model: The model's path relative to the pack
+    :param elements: The amount of elements in the model
+    :return: The north, east, south, west, up and down offsets, followed by the face offset of each element
+    """
+    rng = random.Random(f"{seed}/{model.replace(os.sep, '/')}")
+    return [rng.uniform(0, random_offset) + offset for _ in range(6 + elements)]
+
+
+def _model_margin(elements: list, offsets: List[float]):
+    """
+    Moves the elements of a single model outwards
+    :param elements: The model's elements. They are modified in place
+    :param offsets: The model's offsets from '_margin_offsets'
+    """
+    north_offset, east_offset, south_offset, west_offset, up_offset, down_offset = offsets[:6]
+    for element, calculated_offset in zip(elements, offsets[6:]):
+        position_from = element["from"]
+        position_to = element["to"]
+        direction = get_cube_direction(position_from, position_to)
+        # Move cubes
+        if direction != Direction.CENTER.value:
+            # Center of block offset
+            if direction == Direction.NORTH.value:
+                position_from[2] -= north_offset
+            elif direction == Direction.EAST.value:
+                position_to[0] += east_offset
+            elif direction == Direction.SOUTH.value:
+                position_to[2] += south_offset
+            elif direction == Direction.WEST.value:
+                position_from[0] -= west_offset
+            elif direction == Direction.UP.value:
+                position_to[1] += up_offset
+            elif direction == Direction.DOWN.value:
+                position_from[1] -= down_offset
+            # Center of face offset
+            if position_from[0] == 0:
+                position_from[0] -= calculated_offset
+            if position_from[1] == 0:
+                position_from[1] -= calculated_offset
+            if position_from[2] == 0:
+                position_from[2] -= calculated_offset
+            if position_to[0] == 16:
+                position_to[0] += calculated_offset
+            if position_to[1] == 16:
+                position_to[1] += calculated_offset
+            if position_to[2] == 16:
+                position_to[2] += calculated_offset
+            element["from"] = position_from
+            element["to"] = position_to
+
+
+def _model_margin_numpy(models: List[Tuple[list, List[float]]]):
+    """
+    Does the same as '_model_margin' for many models at once, with every element of every model in one array
+    :param models: The elements and offsets of each model. Elements are modified in place
+    """
+    elements = [element for model_elements, _ in models for element in model_elements]
+    positions_from = numpy.array([element["from"] for element in elements], dtype=numpy.float64)
+    positions_to = numpy.array([element["to"] for element in elements], dtype=numpy.float64)
+    # North, east, south, west, up and down offset of the model each element is in
+    block_offsets = numpy.repeat(numpy.array([offsets[:6] for _, offsets in models], dtype=numpy.float64),
+                                 [len(model_elements) for model_elements, _ in models], axis=0)
+    face_offsets = numpy.array([o for _, offsets in models for o in offsets[6:]], dtype=numpy.float64)
+
+    # Same checks as 'get_cube_direction'
+    center = numpy.all(positions_from == 0, axis=1) & numpy.all(positions_to == 16, axis=1)
+    inside_x = (positions_from[:, 0] >= 0) & (positions_to[:, 0] <= 16)
+    inside_y = (positions_from[:, 1] >= 0) & (positions_to[:, 1] <= 16)
+    inside_z = (positions_from[:, 2] >= 0) & (positions_to[:, 2] <= 16)
+    vertical = ~center & inside_x & inside_z
+    horizontal_z = ~center & ~(inside_x & inside_z) & inside_x & inside_y
+    horizontal_x = ~center & ~(inside_x & inside_z) & ~(inside_x & inside_y) & inside_z & inside_y
+
+    down = vertical & (positions_from[:, 1] <= 0)
+    up = vertical & ~down & (positions_from[:, 1] >= 16)
+    north = horizontal_z & (positions_from[:, 2] <= 0)
+    south = horizontal_z & ~north & (positions_from[:, 2] >= 16)
+    west = horizontal_x & (positions_from[:, 0] <= 0)
+    east = horizontal_x & ~west & (positions_from[:, 0] >= 16)
+
+    # Tracks which coordinates were moved, so untouched coordinates keep their original json type
+    moved_from = numpy.zeros(positions_from.shape, dtype=bool)
+    moved_to = numpy.zeros(positions_to.shape, dtype=bool)
+
+    # Center of block offset
+    for mask, positions, moved, axis, column, sign in ((north, positions_from, moved_from, 2, 0, -1),
+                                                       (east, positions_to, moved_to, 0, 1, 1),
+                                                       (south, positions_to, moved_to, 2, 2, 1),
+                                                       (west, positions_from, moved_from, 0, 3, -1),
+                                                       (up, positions_to, moved_to, 1, 4, 1),
+                                                       (down, positions_from, moved_from, 1, 5, -1)):
+        if sign < 0:
+            positions[mask, axis] -= block_offsets[mask, column]
+        else:
+            positions[mask, axis] += block_offsets[mask, column]
+        moved[mask, axis] = True
+
+    # Center of face offset
+    moved_elements = ~center[:, numpy.newaxis]
+    from_faces = moved_elements & (positions_from == 0)
+    to_faces = moved_elements & (positions_to == 16)
+    positions_from -= numpy.where(from_faces, face_offsets[:, numpy.newaxis], 0)
+    positions_to += numpy.where(to_faces, face_offsets[:, numpy.newaxis], 0)
+    moved_from |= from_faces
+    moved_to |= to_faces
+
+    for i, element in enumerate(elements):
+        for axis in numpy.flatnonzero(moved_from[i]):
+            element["from"][axis] = float(positions_from[i, axis])
+        for axis in numpy.flatnonzero(moved_to[i]):
+            element["to"][axis] = float(positions_to[i, axis])
+
+
+def _margin_chunk(models: List[Tuple[str, list]], seed, offset: float, random_offset: float) -> List[list]:
+    """
+    Moves the elements of a chunk of models outwards. Runs on the worker pool
+    :param models: The path relative to the pack and the elements of each model
+    :param seed: The patch's seed
+    :return: The moved elements of each model
+    """
+    margin_models = [(elements, _margin_offsets(seed, model, len(elements), offset, random_offset))
+                     for model, elements in models]
+    if numpy is not None and len(margin_models) > 0:
+        _model_margin_numpy(margin_models)
+    else:
+        for elements, offsets in margin_models:
+            _model_margin(elements, offsets)
+    return [elements for elements, _ in margin_models]
+
+
+def _patch_modifier(pack: PackFiles, pack_info, patch: Patch, logger: logging.Logger, scope: Optional[set] = None):
     type = patch.patch["type"]
     if type == ModifierType.MODEL_MARGIN.value:
         selector = FileSelector(patch.patch["arguments"]["file_selector"]["type"], patch.patch["arguments"]["file_selector"]["arguments"], pack)
@@ -364,63 +504,33 @@ def _patch_modifier(pack: str, pack_info, patch: Patch, logger: logging.Logger):
         else:
             seed = 0
 
-        random.seed(seed)
-
+        # Every model is loaded first, so their elements can be moved together
+        margin_models = []
         for model in models:
-            if os.path.exists(model):
-                with open(model, "r") as file:
-                    model_data = json.load(file)
+            model = path.join(pack.root, model)
+
+            if not _in_scope(pack.root, model, scope):
+                continue
+
+            if pack.isfile(model):
+                model_data = pack.read_json(model)
                 # Check if model contains elements
                 if "elements" in model_data and len(model_data["elements"]) > 0:
-                    north_offset = random.uniform(0, random_offset) + offset
-                    east_offset = random.uniform(0, random_offset) + offset
-                    south_offset = random.uniform(0, random_offset) + offset
-                    west_offset = random.uniform(0, random_offset) + offset
-                    up_offset = random.uniform(0, random_offset) + offset
-                    down_offset = random.uniform(0, random_offset) + offset
-                    new_elements = []
-                    for element in model_data["elements"]:
-                        position_from = element["from"]
-                        position_to = element["to"]
-                        direction = get_cube_direction(position_from, position_to)
-                        calculated_offset = random.uniform(0, random_offset) + offset
-                        # Move cubes
-                        if direction != Direction.CENTER.value:
-                            # Center of block offset
-                            if direction == Direction.NORTH.value:
-                                position_from[2] -= north_offset
-                            elif direction == Direction.EAST.value:
-                                position_to[0] += east_offset
-                            elif direction == Direction.SOUTH.value:
-                                position_to[2] += south_offset
-                            elif direction == Direction.WEST.value:
-                                position_from[0] -= west_offset
-                            elif direction == Direction.UP.value:
-                                position_to[1] += up_offset
-                            elif direction == Direction.DOWN.value:
-                                position_from[1] -= down_offset
-                            # Center of face offset
-                            if position_from[0] == 0:
-                                position_from[0] -= calculated_offset
-                            if position_from[1] == 0:
-                                position_from[1] -= calculated_offset
-                            if position_from[2] == 0:
-                                position_from[2] -= calculated_offset
-                            if position_to[0] == 16:
-                                position_to[0] += calculated_offset
-                            if position_to[1] == 16:
-                                position_to[1] += calculated_offset
-                            if position_to[2] == 16:
-                                position_to[2] += calculated_offset
-                            element["from"] = position_from
-                            element["to"] = position_to
-                        new_elements.append(element)
-                    model_data["elements"] = new_elements
-                    with open(model, "w", encoding="utf-8") as file:
-                        json.dump(model_data, file, indent="\t")
+                    margin_models.append((model, model_data))
                 else:
                     logger.error(f"file lacks elements: {model}")
             else:
                 logger.warning(f"File couldn't be found: {model}")
+
+        # Models are split into chunks that are moved on the worker pool
+        chunk_size = max(MARGIN_CHUNK_SIZE, math.ceil(len(margin_models) / (os.cpu_count() or 1)))
+        chunks = [[(path.relpath(model, pack.root), model_data["elements"])
+                   for model, model_data in margin_models[i:i + chunk_size]]
+                  for i in range(0, len(margin_models), chunk_size)]
+        moved = map_jobs(_margin_chunk, [(chunk, seed, offset, random_offset) for chunk in chunks], star=True)
+
+        for (model, model_data), elements in zip(margin_models, [e for chunk in moved for e in chunk]):
+            model_data["elements"] = elements
+            pack.write_json(model, model_data, "\t")
     else:
         logger.error(f"Incorrect modifier type: {type}")
@@ -0,0 +1,133 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Callable, List
+
+from resource_pack_packer.staging import PackFiles
+from resource_pack_packer.util.workers import get_pool
+
+
+class BuildStep:
+    """
+    A step of a config's build.
+    """
+
+    def __init__(self, signature: Optional[tuple], run: Callable[[PackFiles, logging.Logger], None],
+                 footprint: Optional[Callable[[PackFiles], Optional[List[str]]]] = None):
+        """
+        :param signature: Identifies the work the step does. Steps with the same signature do the same thing to the
+                          same pack. If None, then the step can never be shared with another config
+        :param run: Runs the step on a pack
+        :param footprint: Finds every file or folder, relative to the pack, that the step could read or write. If
+                          None, or it returns None, then the step could touch anything
+        """
+        self.signature = signature
+        self.run = run
+        self.footprint = footprint
+
+
+def common_prefix(step_lists: List[List[BuildStep]]) -> int:
+    """
+    Finds how many steps every build starts with
+    :param step_lists: The steps of each build
+    :return: The amount of steps that are the same in every build
+    """
+    if len(step_lists) == 0:
+        return 0
+
+    prefix = 0
+    for steps in zip(*step_lists):
+        signature = steps[0].signature
+        if signature is None or any(step.signature != signature for step in steps):
+            break
+        prefix += 1
+    return prefix
+
+
+class BuildPlan:
+    """
+    A group of configs that share the start of their build. The shared steps are run once and every config continues
+    from a fork of the result.
+    """
+
+    def __init__(self, configs: list, shared_steps: int = 0, pack_files: Optional[PackFiles] = None):
+        """
+        :param configs: The configs built by this plan
+        :param shared_steps: The amount of steps that are shared
+        :param pack_files: The pack after the shared steps have been run
+        """
+        self.configs = configs
+        self.shared_steps = shared_steps
+        self.pack_files = pack_files
+
+
+class Footprint:
+    """
+    The files and folders that a step could touch. A folder includes everything in it.
+    """
+
+    def __init__(self, paths: Optional[List[str]]):
+        """
+        :param paths: Paths relative to the pack. If None, then the footprint covers the whole pack
+        """
+        self.everything = paths is None
+        self.paths = set()
+        # Every folder that contains a path
+        self.ancestors = set()
+
+        for path in paths or ():
+            path = os.path.normpath(path)
+            if path == os.curdir:
+                self.everything = True
+                break
+
+            self.paths.add(path)
+            parent = os.path.dirname(path)
+            while parent != "" and parent not in self.ancestors:
+                self.ancestors.add(parent)
+                parent = os.path.dirname(parent)
+
+    def overlaps(self, other: "Footprint") -> bool:
+        if self.everything or other.everything:
+            return True
+        return not (self.paths.isdisjoint(other.paths) and self.paths.isdisjoint(other.ancestors) and
+                    other.paths.isdisjoint(self.ancestors))
+
+
+def run_steps(steps: List[BuildStep], pack_files: PackFiles, logger: logging.Logger, workers: int = 1):
+    """
+    Runs build steps. If there is more than one worker, then steps that touch different files run at the same time,
+    while a step always runs after every earlier step that it overlaps with, so the result is the same as running them
+    in order
+    :param steps: The steps in their declared order
+    :param pack_files: The pack being built
+    :param logger: The config's logger
+    :param workers: The max amount of steps that run at the same time
+    """
+    if workers <= 1 or len(steps) <= 1:
+        for step in steps:
+            step.run(pack_files, logger)
+        return
+
+    # Patches can use the worker pool. Forking it while other threads hold locks can deadlock the workers, so it is
+    # started before any step runs
+    get_pool()
+
+    footprints = [Footprint(step.footprint(pack_files) if step.footprint is not None else None) for step in steps]
+    # Step -> earlier steps it has to wait for
+    dependencies = [set(j for j in range(i) if footprints[i].overlaps(footprints[j])) for i in range(len(steps))]
+
+    pending = list(range(len(steps)))
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while len(pending) > 0 or len(running) > 0:
+            for i in [i for i in pending if dependencies[i] <= done]:
+                pending.remove(i)
+                running[executor.submit(steps[i].run, pack_files, logger)] = i
+
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                # Raises errors from the step
+                future.result()
+                done.add(running.pop(future))
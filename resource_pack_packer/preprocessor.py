@@ -1,8 +1,12 @@
-import json
 import os
+from enum import Enum
+from timeit import default_timer
 from typing import Optional
 
-from resource_pack_packer.selectors import parse_minecraft_identifier, Direction
+from resource_pack_packer.geometry import ElementGeometry, ELEMENT_ANGLES, identity_matrix, multiply, \
+    translation_matrix, rotation_matrix, scale_matrix
+from resource_pack_packer.selectors import parse_minecraft_identifier
+from resource_pack_packer.staging import PackFiles, VirtualPackFiles
 
 
 def get_from_dict(dictionary: dict, key: str, default=None):
@@ -11,50 +15,67 @@ def get_from_dict(dictionary: dict, key: str, default=None):
     return default
 
 
-def find_model(identifier: str, temp_dir: str) -> str:
+def find_model(identifier: str, pack: PackFiles) -> str:
     model_path = parse_minecraft_identifier(identifier, "models", "json")
-    return os.path.join(temp_dir, model_path)
+    return os.path.join(pack.root, model_path)
 
 
 class Model:
     parent: Optional[str]
     textures: Optional[dict]
-    elements: list[dict]
     display: Optional[dict]
 
     def __init__(self, parent: Optional[str], textures: Optional[dict], elements: list[dict], display: Optional[dict],
-                 temp_dir: str):
+                 models: "ModelRepository", file: Optional[str] = None, geometry: Optional[ElementGeometry] = None):
         self.parent = parent
         self.textures = textures
-        self.elements = elements
         self.display = display
-
-        if self.parent is not None:
-            self.apply_parent(temp_dir)
+        self.models = models
+        # The model's file in the pack. None if the model was made by a preprocessor
+        self.file = file
+        self._elements = elements
+        # Elements that are being transformed. They replace 'elements' once the model is read as json
+        self.geometry = geometry
+
+    @property
+    def elements(self) -> list[dict]:
+        """The model's elements. If it has none, then they are inherited from its parents"""
+        if self.geometry is not None:
+            self._elements = self.geometry.to_elements()
+            self.geometry = None
+
+        if len(self._elements) > 0 or self.parent is None:
+            return self._elements
+        elif self.file is not None:
+            return self.models.elements(self.file)
+        return self.models.elements(find_model(self.parent, self.models.pack))
+
+    @elements.setter
+    def elements(self, elements: list[dict]):
+        self._elements = elements
+        self.geometry = None
+
+    def get_geometry(self) -> ElementGeometry:
+        """
+        :return: The model's elements as geometry, which can be transformed without changing the model
+        """
+        if self.geometry is not None and len(self.geometry) > 0:
+            geometry = ElementGeometry()
+            geometry.extend(self.geometry)
+            return geometry
+        return ElementGeometry.from_elements(self.elements)
 
     @staticmethod
-    def parse(data: dict, temp_dir: str) -> "Model":
+    def parse(data: dict, models: "ModelRepository", file: Optional[str] = None) -> "Model":
         return Model(get_from_dict(data, "parent"),
                      get_from_dict(data, "textures"),
                      get_from_dict(data, "elements", []),
                      get_from_dict(data, "display"),
-                     temp_dir)
-
-    @staticmethod
-    def parse_file(file, temp_dir: str) -> "Model":
-        with open(file, "r") as model:
-            data = json.load(model)
-        return Model.parse(data, temp_dir)
-
-    def apply_parent(self, temp_dir: str):
-        parent_model = Model.parse_file(os.path.join(temp_dir, find_model(self.parent, temp_dir)), temp_dir)
-
-        # Apply elements to child
-        if len(self.elements) == 0:
-            self.elements = parent_model.elements
+                     models,
+                     file)
 
     @staticmethod
-    def save(model: "Model", path: str):
+    def save(model: "Model", path: str, pack: PackFiles):
         model_data = {}
         if model.parent is not None:
             model_data |= {"parent": model.parent}
@@ -65,8 +86,140 @@ class Model:
         if model.display is not None:
             model_data |= {"display": model.display}
 
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(model_data, file, indent=2, ensure_ascii=False)
+        pack.write_json(path, model_data, 2)
+
+
+class ModelRepository:
+    """
+    The models of a pack while it is being preprocessed. Each model file is parsed once per build and the elements
+    that a model inherits from its parents are resolved once, the first time they are needed.
+    """
+
+    def __init__(self, pack: PackFiles):
+        self.pack = pack
+        # Model file -> parsed model. None if the file isn't in the pack
+        self.models: dict[str, Optional[Model]] = {}
+        # Model file -> its elements after inheriting from its parents
+        self._elements: dict[str, list[dict]] = {}
+        # Model file -> model files that inherit their elements from it
+        self._children: dict[str, set[str]] = {}
+        # Model files whose elements are being resolved, used to find parent loops
+        self._resolving: list[str] = []
+
+    def get(self, file: str) -> Optional[Model]:
+        """
+        :param file: A model file in the pack
+        :return: The parsed model. If the file doesn't exist, then it will be None
+        """
+        file = os.path.normpath(file)
+        if file not in self.models:
+            data = self.pack.read_json(file)
+            self.models[file] = None if data is None else Model.parse(data, self, file)
+        return self.models[file]
+
+    def find(self, identifier: str) -> Model:
+        """
+        :param identifier: A Minecraft model identifier
+        :return: The parsed model
+        """
+        model = self.get(find_model(identifier, self.pack))
+        if model is None:
+            raise FileNotFoundError(f"Could not find model: {identifier}")
+        return model
+
+    def elements(self, file: str) -> list[dict]:
+        """
+        Gets the elements of a model, inheriting them from its parents if it has none
+        :param file: A model file in the pack
+        :return: The elements. Models outside of the pack, like vanilla models, have none
+        """
+        file = os.path.normpath(file)
+        elements = self._elements.get(file)
+        if elements is not None:
+            return elements
+
+        if file in self._resolving:
+            loop = self._resolving[self._resolving.index(file):] + [file]
+            raise ValueError(f"Models inherit from each other: {' -> '.join(loop)}")
+
+        model = self.get(file)
+        if model is None:
+            elements = []
+        elif len(model._elements) > 0 or model.parent is None:
+            elements = model._elements
+        else:
+            parent = os.path.normpath(find_model(model.parent, self.pack))
+            self._children.setdefault(parent, set()).add(file)
+            self._resolving.append(file)
+            try:
+                elements = self.elements(parent)
+            finally:
+                self._resolving.pop()
+        self._elements[file] = elements
+        return elements
+
+    def inputs(self, identifiers: list[str]) -> dict[str, dict]:
+        """
+        Gets everything that a rpp model reads, so it can be processed without the pack
+        :param identifiers: The models that the rpp model references
+        :return: Model file -> model json. Elements are already inherited from parents. Missing models are left out
+        """
+        inputs = {}
+        for identifier in identifiers:
+            file = os.path.normpath(find_model(identifier, self.pack))
+            model = self.get(file)
+            if model is None or file in inputs:
+                continue
+            data = {"elements": model.elements}
+            if model.parent is not None:
+                data["parent"] = model.parent
+            if model.textures is not None:
+                data["textures"] = model.textures
+            if model.display is not None:
+                data["display"] = model.display
+            inputs[file] = data
+        return inputs
+
+    def parents(self, file: str) -> list[str]:
+        """
+        :param file: A model file in the pack
+        :return: The model's file followed by the files of its parents that are in the pack
+        """
+        files = []
+        file = os.path.normpath(file)
+        while file not in files:
+            files.append(file)
+            model = self.get(file)
+            if model is None or model.parent is None:
+                break
+            file = os.path.normpath(find_model(model.parent, self.pack))
+        return files
+
+    def save(self, model: Model, file: str):
+        """
+        Writes a model to the pack. Models that inherit from it are resolved again
+        :param model: The model to write
+        :param file: Where the model goes in the pack
+        """
+        file = os.path.normpath(file)
+        Model.save(model, file, self.pack)
+
+        invalid = [file]
+        while len(invalid) > 0:
+            invalid_file = invalid.pop()
+            self.models.pop(invalid_file, None)
+            self._elements.pop(invalid_file, None)
+            invalid += self._children.pop(invalid_file, ())
+
+
+class ModifyType(Enum):
+    TRANSLATE = "translate"
+    FLIP = "flip"
+    ROTATE = "rotate"
+    SCALE = "scale"
+    MATRIX = "matrix"
+    # A list of translate, rotate, scale and matrix transforms
+    TRANSFORM = "transform"
 
 
 class RPPModel:
@@ -84,119 +237,172 @@ class RPPModel:
         return RPPModel(get_from_dict(data, "identifier"), get_from_dict(data, "modify"), get_from_dict(data, "mixin"))
 
     @staticmethod
-    def parse_file(file: str) -> "RPPModel":
-        with open(file, "r") as model:
-            data = json.load(model)
-        return RPPModel.parse(data)
-
-    @staticmethod
-    def _flip_uv_x(uv: list[float]) -> list[float]:
-        return [uv[2], uv[1], uv[0], uv[3]]
-
-    @staticmethod
-    def _flip_uv_y(uv: list[float]) -> list[float]:
-        return [uv[0], uv[3], uv[2], uv[1]]
+    def parse_file(file: str, pack: PackFiles) -> "RPPModel":
+        return RPPModel.parse(pack.read_json(file))
 
-    def _modify(self, temp_dir: str) -> Model:
-        model = Model.parse_file(find_model(self.modify["model"], temp_dir), temp_dir)
-        if self.modify["type"] == "translate":
+    def references(self) -> list[str]:
+        """
+        :return: The identifiers of every model that is read while processing, including by nested rpp models
+        """
+        if self.modify is not None:
+            return [self.modify["model"]]
+        elif self.mixin is not None:
+            references = []
+            for model in self.mixin["models"]:
+                if isinstance(model, str):
+                    references.append(model)
+                else:
+                    references += RPPModel.parse(model).references()
+            return references
+        return []
+
+    def _modify(self, models: ModelRepository) -> Model:
+        source = models.find(self.modify["model"])
+        # The elements are shared with the pack's copy of the model and every model that inherits them
+        geometry = source.get_geometry()
+        if self.modify["type"] == ModifyType.TRANSLATE.value:
             x = get_from_dict(self.modify["arguments"], "x", 0.0)
             y = get_from_dict(self.modify["arguments"], "y", 0.0)
             z = get_from_dict(self.modify["arguments"], "z", 0.0)
-
-            for element in model.elements:
-                element["from"] = [element["from"][0] + x, element["from"][1] + y, element["from"][2] + z]
-                element["to"] = [element["to"][0] + x, element["to"][1] + y, element["to"][2] + z]
-        elif self.modify["type"] == "flip":
+            geometry.translate(x, y, z)
+        elif self.modify["type"] == ModifyType.FLIP.value:
             origin = get_from_dict(self.modify["arguments"], "origin", [8.0, 8.0, 8.0])
             x = get_from_dict(self.modify["arguments"], "x", False)
             y = get_from_dict(self.modify["arguments"], "y", False)
             z = get_from_dict(self.modify["arguments"], "z", False)
+            geometry.flip(origin, x, y, z)
+        elif self.modify["type"] == ModifyType.TRANSFORM.value:
+            RPPModel._transform(geometry, self.modify["arguments"]["transforms"])
+        elif self.modify["type"] in (ModifyType.ROTATE.value, ModifyType.SCALE.value, ModifyType.MATRIX.value):
+            RPPModel._transform(geometry, [self.modify])
+        return Model(source.parent, source.textures, [], source.display, models, geometry=geometry)
 
-            # Flip elements
-            for element in model.elements:
-                if x:
-                    from_pos = element["from"][0]
-                    to_pos = element["to"][0]
-                    element["from"][0] = origin[0] + (origin[0] - to_pos)
-                    element["to"][0] = origin[0] + (origin[0] - from_pos)
-                if y:
-                    from_pos = element["from"][1]
-                    to_pos = element["to"][1]
-                    element["from"][1] = origin[1] + (origin[1] - to_pos)
-                    element["to"][1] = origin[1] + (origin[1] - from_pos)
-                if z:
-                    from_pos = element["from"][2]
-                    to_pos = element["to"][2]
-                    element["from"][2] = origin[2] + (origin[2] - to_pos)
-                    element["to"][2] = origin[2] + (origin[2] - from_pos)
-
-                flipped_faces = {}
-
-                # Flip faces
-                for direction, face in element["faces"].items():
-                    flipped_direction = direction
-                    # Flip face
-                    if (x and (direction == Direction.EAST.value or direction == Direction.WEST.value)) or \
-                            (y and (direction == Direction.UP.value or direction == Direction.DOWN.value)) or \
-                            (z and (direction == Direction.NORTH.value or direction == Direction.SOUTH.value)):
-                        flipped_direction = Direction.flip(direction)
-
-                    # Culling
-                    if "cullface" in face:
-                        if (x and (face["cullface"] == Direction.EAST.value or face["cullface"] == Direction.WEST.value)) or \
-                                (y and (face["cullface"] == Direction.UP.value or face["cullface"] == Direction.DOWN.value)) or \
-                                (z and (face["cullface"] == Direction.NORTH.value or face["cullface"] == Direction.SOUTH.value)):
-                            face["cullface"] = Direction.flip(face["cullface"])
-
-                    # UV
-                    if x:
-                        if flipped_direction == Direction.UP.value or flipped_direction == Direction.DOWN.value:
-                            face["uv"] = RPPModel._flip_uv_x(face["uv"])
-                        else:
-                            face["uv"] = RPPModel._flip_uv_y(face["uv"])
-                    if z:
-                        if flipped_direction == Direction.UP.value or flipped_direction == Direction.DOWN.value:
-                            face["uv"] = RPPModel._flip_uv_y(face["uv"])
-                        else:
-                            face["uv"] = RPPModel._flip_uv_x(face["uv"])
-                    if y:
-                        if not (flipped_direction == Direction.UP.value or flipped_direction == Direction.DOWN.value):
-                            face["uv"] = RPPModel._flip_uv_x(face["uv"])
-
-                    flipped_faces |= {flipped_direction: face}
-                element["faces"] = flipped_faces
-        return model
-
-    def _mixin(self, temp_dir: str) -> Model:
+    @staticmethod
+    def _transform(geometry: ElementGeometry, transforms: list[dict]):
+        """
+        Combines transforms into one matrix and applies it to every element once
+        :param transforms: Translate, rotate, scale and matrix transforms, in the order that they are applied
+        """
+        matrix = identity_matrix()
+        # Element rotation that is left after 90 degree steps
+        rotation = None
+        for transform in transforms:
+            if rotation is not None:
+                raise ValueError("Rotations that aren't 90 degree steps must be the last transform")
+
+            arguments = get_from_dict(transform, "arguments", {})
+            origin = get_from_dict(arguments, "origin", [8.0, 8.0, 8.0])
+            match transform["type"]:
+                case ModifyType.TRANSLATE.value:
+                    step = translation_matrix(get_from_dict(arguments, "x", 0.0), get_from_dict(arguments, "y", 0.0),
+                                              get_from_dict(arguments, "z", 0.0))
+                case ModifyType.ROTATE.value:
+                    turns = round(arguments["angle"] / 90)
+                    step = rotation_matrix(arguments["axis"], turns, origin)
+                    angle = arguments["angle"] - turns * 90
+                    if angle not in ELEMENT_ANGLES:
+                        raise ValueError(f"Rotation angles must be multiples of 22.5: {arguments['angle']}")
+                    if angle != 0:
+                        rotation = (arguments["axis"], angle, origin, get_from_dict(arguments, "rescale", False))
+                case ModifyType.SCALE.value:
+                    step = scale_matrix(get_from_dict(arguments, "x", 1), get_from_dict(arguments, "y", 1),
+                                        get_from_dict(arguments, "z", 1), origin)
+                case ModifyType.MATRIX.value:
+                    step = arguments["matrix"]
+                case _:
+                    raise ValueError(f"Incorrect transform type: {transform['type']}")
+            matrix = multiply(step, matrix)
+
+        geometry.transform(matrix)
+        if rotation is not None:
+            geometry.rotate(*rotation)
+
+    def _mixin(self, models: ModelRepository) -> Model:
         parent = None
         textures = {}
-        elements = []
+        geometry = ElementGeometry()
         display = {}
 
         for model in self.mixin["models"]:
             # Minecraft model
             if isinstance(model, str):
-                parsed_model = Model.parse_file(find_model(model, temp_dir), temp_dir)
+                parsed_model = models.find(model)
             # RPP model
             else:
-                parsed_model = RPPModel.parse(model).process(temp_dir)[0]
+                parsed_model = RPPModel.parse(model).process(models)[0]
 
             if parsed_model.parent is not None:
                 parent = parsed_model.parent
             if parsed_model.textures is not None:
                 textures |= parsed_model.textures
-            if parsed_model.elements is not None:
-                elements += parsed_model.elements
+            # Elements are combined as geometry, so models made by other preprocessors are never turned into json
+            geometry.extend(parsed_model.get_geometry())
             if parsed_model.display is not None:
                 display |= parsed_model.display
 
-        return Model(parent, textures, elements, display, temp_dir)
+        return Model(parent, textures, [], display, models, geometry=geometry)
 
-    def process(self, temp_dir: str) -> tuple[Model, str]:
+    def process(self, models: ModelRepository) -> tuple[Model, str]:
         if self.modify is not None:
-            return self._modify(temp_dir), self.identifier
+            return self._modify(models), self.identifier
         elif self.mixin is not None:
-            return self._mixin(temp_dir), self.identifier
+            return self._mixin(models), self.identifier
         else:
-            return Model(None, None, [], None, temp_dir), self.identifier
+            return Model(None, None, [], None, models), self.identifier
+
+
+def process_rpp(root: str, rpp_data: dict, inputs: dict[str, dict]) -> tuple[tuple, float]:
+    """
+    Processes a rpp model without the pack. Runs on the worker pool
+    :param root: The folder of the pack
+    :param rpp_data: The rpp model's json
+    :param inputs: The models it reads, from 'ModelRepository.inputs'
+    :return: The processed model's parent, textures, elements, display and geometry, and the seconds it took
+    """
+    start_time = default_timer()
+    pack = VirtualPackFiles(root)
+    for file, data in inputs.items():
+        pack.write_json(file, data)
+
+    model = RPPModel.parse(rpp_data).process(ModelRepository(pack))[0]
+    # Inherited elements are left to the build's repository, which knows every model in the pack
+    return (model.parent, model.textures, model._elements, model.display, model.geometry), default_timer() - start_time
+
+
+def order_rpp_models(rpp_models: dict[str, RPPModel], models: ModelRepository) -> list[list[str]]:
+    """
+    Orders rpp models so that every model runs after the rpp models that make the models it reads
+    :param rpp_models: Rpp model file -> parsed rpp model, in the order they were found
+    :param models: The pack's models
+    :return: Groups of rpp model files. Models in a group don't depend on each other
+    """
+    root = models.pack.root
+    # Model file -> rpp model files that write it
+    outputs: dict[str, list[str]] = {}
+    for file, rpp_model in rpp_models.items():
+        output = os.path.normpath(os.path.join(root, parse_minecraft_identifier(rpp_model.identifier, "models", "json")))
+        outputs.setdefault(output, []).append(file)
+
+    dependencies: dict[str, set[str]] = {}
+    for file, rpp_model in rpp_models.items():
+        dependencies[file] = set()
+        for identifier in rpp_model.references():
+            # A model also depends on its parents, which could be made by other rpp models
+            for model_file in models.parents(find_model(identifier, models.pack)):
+                if model_file in outputs:
+                    # A model that replaces a model it reads, reads the original
+                    if file not in outputs[model_file]:
+                        dependencies[file].update(outputs[model_file])
+                    break
+
+    groups = []
+    done = set()
+    remaining = list(rpp_models.keys())
+    while len(remaining) > 0:
+        group = [file for file in remaining if dependencies[file] <= done]
+        if len(group) == 0:
+            raise ValueError(f"Rpp models depend on each other: {', '.join(remaining)}")
+        groups.append(group)
+        done.update(group)
+        remaining = [file for file in remaining if file not in done]
+    return groups
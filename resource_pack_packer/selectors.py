@@ -2,8 +2,14 @@ import logging
 import os
 import re
 from enum import Enum
-from glob import glob
-from typing import List, Optional
+from typing import List, Optional, TYPE_CHECKING
+
+from resource_pack_packer.util.patterns import compile_regex
+
+if TYPE_CHECKING:
+    from resource_pack_packer.staging import PackFiles
+
+NAMESPACE_REGEX = re.compile("^[a-z]*(?=:)")
 
 
 def parse_minecraft_identifier(identifier: str, folder: str, extension: str):
@@ -16,8 +22,7 @@ def parse_minecraft_identifier(identifier: str, folder: str, extension: str):
     :return: Relative path from resource pack
     """
     file_path = os.path.normpath(identifier)
-    namespace_regex = re.compile("^[a-z]*(?=:)")
-    namespace_match = re.match(namespace_regex, file_path)
+    namespace_match = NAMESPACE_REGEX.match(file_path)
     if namespace_match is not None:
         span = namespace_match.span()
         namespace = file_path[span[0]:span[1]]
@@ -39,7 +44,7 @@ class FileSelector:
     Select a collection of files from a patch file.
     """
 
-    def __init__(self, selector_type: str, arguments: dict, pack: str):
+    def __init__(self, selector_type: str, arguments: dict, pack: "PackFiles"):
         self.selector_type = selector_type
         self.arguments = arguments
         self.pack = pack
@@ -56,15 +61,15 @@ class FileSelector:
                 else:
                     recursive = False
 
-                files = glob(os.path.join(self.pack, file_path, "*"), recursive=recursive)
+                files = self.pack.glob(os.path.join(self.pack.root, file_path, "*"), recursive=recursive)
 
                 if "regex" in self.arguments:
-                    regex = re.compile(self.arguments["regex"])
+                    regex = compile_regex(self.arguments["regex"])
 
                     sorted_files = []
                     for file in files:
-                        if regex.match(os.path.relpath(file, os.path.join(self.pack, file_path))) is not None:
-                            sorted_files.append(os.path.relpath(file, self.pack))
+                        if regex.match(os.path.relpath(file, os.path.join(self.pack.root, file_path))) is not None:
+                            sorted_files.append(os.path.relpath(file, self.pack.root))
                     return sorted_files
                 else:
                     return files
@@ -84,9 +89,9 @@ class FileSelector:
                 else:
                     lang_files = []
 
-                parsed_models = list(map(lambda m: os.path.join(self.pack, parse_minecraft_identifier(m, "models", "json")), models))
-                parsed_blockstates = list(map(lambda b: os.path.join(self.pack, parse_minecraft_identifier(b, "blockstates", "json")), blockstates))
-                parsed_lang_files = list(map(lambda l: os.path.join(self.pack, parse_minecraft_identifier(l, "lang", "json")), lang_files))
+                parsed_models = list(map(lambda m: os.path.join(self.pack.root, parse_minecraft_identifier(m, "models", "json")), models))
+                parsed_blockstates = list(map(lambda b: os.path.join(self.pack.root, parse_minecraft_identifier(b, "blockstates", "json")), blockstates))
+                parsed_lang_files = list(map(lambda l: os.path.join(self.pack.root, parse_minecraft_identifier(l, "lang", "json")), lang_files))
 
                 return parsed_models + parsed_blockstates + parsed_lang_files
             case FileSelectorType.BLOCK.value:
@@ -113,8 +118,8 @@ class FileSelector:
                         for block_file in pack_info.block_files:
                             parsed_block_file = block_file.replace("[block_name]", block_single)
                             parsed_block_file = parsed_block_file.replace("[block_name_plural]", block_plural)
-                            if os.path.exists(os.path.join(self.pack, parsed_block_file)):
-                                parsed_block_files.append(os.path.join(self.pack, parsed_block_file))
+                            if self.pack.exists(os.path.join(self.pack.root, parsed_block_file)):
+                                parsed_block_files.append(os.path.join(self.pack.root, parsed_block_file))
                     else:
                         logger.error("block_files is not set")
                         return
@@ -125,8 +130,34 @@ class FileSelector:
                 logger.error(f"Incorrect file selector type: {self.selector_type}")
                 return
 
+    def footprint(self, pack_info) -> Optional[List[str]]:
+        """
+        Finds every file or folder that the selector could select, without searching the pack
+        :return: Paths relative to the pack. Folders include everything in them. If None, then anything can be selected
+        """
+        match self.selector_type:
+            case FileSelectorType.FILE.value | FileSelectorType.IDENTIFIER.value:
+                return [os.path.relpath(os.path.join(self.pack.root, file), self.pack.root)
+                        for file in self.run(pack_info, logging.getLogger())]
+            case FileSelectorType.PATH.value:
+                return [os.path.normpath(self.arguments["path"])]
+            case FileSelectorType.BLOCK.value:
+                if pack_info.block_files is None:
+                    return None
+
+                files = []
+                for block in self.arguments["blocks"]:
+                    block_plural = block["block"]
+                    block_single = block_plural[:-1] if "plural" in block and block["plural"] else block_plural
+                    for block_file in pack_info.block_files:
+                        files.append(os.path.normpath(block_file.replace("[block_name]", block_single)
+                                                      .replace("[block_name_plural]", block_plural)))
+                return files
+            case _:
+                return None
+
     @staticmethod
-    def parse(data: dict, pack):
+    def parse(data: dict, pack: "PackFiles"):
         return FileSelector(data["type"], data["arguments"], pack)
 
 
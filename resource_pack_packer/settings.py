@@ -41,21 +41,29 @@ MAIN_SETTINGS = Settings(0)\
         "out_dir": "#packdir",
         "version": "DEV",
         "rerun": True,
-        "validate": True
+        "validate": True,
+        "incremental": True
     })\
     .add_property("run_options", "build", {
         "configs": "*",
         "minify_json": True,
         "delete_empty_folders": True,
-        "zip_pack": True
+        "zip_pack": True,
+        "virtual": True
     })\
     .add_property("run_options", "build_single", {
         "configs": "?",
         "minify_json": True,
         "delete_empty_folders": True,
-        "zip_pack": True
+        "zip_pack": True,
+        "virtual": True
     })\
-    .add_property("tokens", "curseforge")
+    .add_property("tokens", "curseforge")\
+    .add_property("performance", "copy_workers", 0)\
+    .add_property("performance", "link_mode", "auto")\
+    .add_property("performance", "patch_workers", 1)\
+    .add_property("watch", "interval", 0.5)\
+    .add_property("watch", "debounce", 0.3)
 
 # Load settings file
 MAIN_SETTINGS.load()
@@ -0,0 +1,659 @@
+import copy
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from glob import has_magic
+from typing import Optional, Iterable
+
+from resource_pack_packer.util.copier import CopyEngine, CopyStats, dump_json
+from resource_pack_packer.util.patterns import compile_glob
+
+# Amount of files that one thread unlinks at a time
+REMOVE_BATCH_SIZE = 256
+
+
+class _JsonDocument:
+    def __init__(self, data, indent, modified: bool):
+        self.data = data
+        self.indent = indent
+        self.modified = modified
+
+
+class PackIndex:
+    """
+    Every file and folder of a pack, so that lookups and globs never touch the disk. Paths are absolute and
+    normalized.
+    """
+
+    def __init__(self, root: str, prune_empty: bool = False):
+        """
+        :param root: The folder of the pack
+        :param prune_empty: Should folders be removed with their last file
+        """
+        self.root = os.path.normpath(root)
+        self.prune_empty = prune_empty
+        # Folder path -> names of the files and folders in it
+        self.children: dict[str, set[str]] = {self.root: set()}
+        self.file_set: set[str] = set()
+        # Sorted 'file_set', rebuilt after the index changes
+        self._sorted: Optional[list[str]] = None
+        # Patches that touch different files can change the index at the same time
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_directory(root: str, prune_empty: bool = False) -> "PackIndex":
+        """
+        Indexes a folder on disk
+        :param root: The folder of the pack
+        :param prune_empty: Should folders be removed with their last file
+        """
+        index = PackIndex(root, prune_empty)
+        if os.path.isdir(index.root):
+            index._scan(index.root)
+        return index
+
+    def _scan(self, directory: str):
+        names = self.children[directory]
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                names.add(entry.name)
+                if entry.is_dir():
+                    self.children[entry.path] = set()
+                    self._scan(entry.path)
+                else:
+                    self.file_set.add(entry.path)
+
+    def copy(self, root: str) -> "PackIndex":
+        """
+        Copies the index to another root
+        :param root: The folder of the new pack
+        """
+        index = PackIndex(root, self.prune_empty)
+
+        def move(path: str) -> str:
+            return os.path.normpath(os.path.join(index.root, os.path.relpath(path, self.root)))
+
+        index.children = {move(path): set(names) for path, names in self.children.items()}
+        index.file_set = set(map(move, self.file_set))
+        return index
+
+    def isfile(self, path: str) -> bool:
+        return path in self.file_set
+
+    def isdir(self, path: str) -> bool:
+        return path in self.children
+
+    def files(self) -> list[str]:
+        """
+        :return: Every file in sorted order
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self.file_set)
+        return self._sorted
+
+    def add_file(self, path: str):
+        with self._lock:
+            if path in self.file_set:
+                return
+            self.file_set.add(path)
+            self._sorted = None
+
+            # Register parent folders
+            while path != self.root:
+                parent, name = os.path.split(path)
+                if parent in self.children:
+                    self.children[parent].add(name)
+                    break
+                self.children[parent] = {name}
+                path = parent
+
+    def remove(self, path: str) -> list[str]:
+        """
+        Removes a file or folder
+        :param path: The file or folder to remove
+        :return: Every removed file
+        """
+        with self._lock:
+            removed = []
+            if path in self.children:
+                self._remove_tree(path, removed)
+            elif path in self.file_set:
+                self.file_set.remove(path)
+                removed.append(path)
+            else:
+                return removed
+            self._sorted = None
+
+            while path != self.root:
+                parent, name = os.path.split(path)
+                siblings = self.children[parent]
+                siblings.discard(name)
+                if not self.prune_empty or len(siblings) > 0 or parent == self.root:
+                    break
+                del self.children[parent]
+                path = parent
+            return removed
+
+    def _remove_tree(self, path: str, removed: list[str]):
+        for name in self.children.pop(path):
+            child = os.path.join(path, name)
+            if child in self.children:
+                self._remove_tree(child, removed)
+            else:
+                self.file_set.remove(child)
+                removed.append(child)
+
+        if path == self.root:
+            self.children[self.root] = set()
+
+    def glob(self, pattern: str, recursive: bool = False) -> list[str]:
+        """
+        Works like 'glob.glob' for patterns inside of the pack. Hidden files only match patterns that start with '.'
+        """
+        parts = os.path.relpath(os.path.normpath(pattern), self.root).split(os.sep)
+        matches = [self.root]
+
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            next_matches = []
+            for match in matches:
+                if recursive and part == "**":
+                    next_matches += self._descendants(match, not last)
+                elif has_magic(part):
+                    part_pattern = compile_glob(part)
+                    for name in sorted(self.children.get(match, ())):
+                        if part_pattern.match(name) and (not name.startswith(".") or part.startswith(".")):
+                            next_matches.append(os.path.join(match, name))
+                elif part == os.curdir:
+                    next_matches.append(match)
+                elif os.path.join(match, part) in self.children or os.path.join(match, part) in self.file_set:
+                    next_matches.append(os.path.join(match, part))
+            matches = next_matches
+        return matches
+
+    def _descendants(self, path: str, folders_only: bool) -> list[str]:
+        if path not in self.children:
+            return []
+
+        descendants = [path]
+        for name in sorted(self.children[path]):
+            if name.startswith("."):
+                continue
+            child = os.path.join(path, name)
+            if child in self.children:
+                descendants += self._descendants(child, folders_only)
+            elif not folders_only:
+                descendants.append(child)
+        return descendants
+
+
+class PackFiles(ABC):
+    """
+    The files of a pack while it is being built. Every path is absolute and inside of 'root'.
+
+    Json files are parsed at most once per build. Every stage shares the parsed document, edits it in place and hands
+    it back with 'write_json'. Documents are only serialized once, when the pack is written.
+    """
+
+    def __init__(self, root: str, minify: bool = False, copy_engine: Optional[CopyEngine] = None):
+        """
+        :param root: The folder of the pack
+        :param minify: Should json files be written without indentation
+        :param copy_engine: Used to copy files into the pack. If None, then a default engine is used
+        """
+        self.root = os.path.normpath(root)
+        self.minify = minify
+        self.copy_engine = copy_engine if copy_engine is not None else CopyEngine()
+        self.documents: dict[str, _JsonDocument] = {}
+        self._index: Optional[PackIndex] = None
+
+    @property
+    def index(self) -> PackIndex:
+        """The files of the pack. Every lookup and glob uses it instead of the disk"""
+        if self._index is None:
+            self._index = self._create_index()
+        return self._index
+
+    @abstractmethod
+    def _create_index(self) -> PackIndex:
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        return self.index.isfile(path) or self.index.isdir(path)
+
+    def isfile(self, path: str) -> bool:
+        return self.index.isfile(os.path.normpath(path))
+
+    def isdir(self, path: str) -> bool:
+        return self.index.isdir(os.path.normpath(path))
+
+    def glob(self, pattern: str, recursive: bool = False) -> list[str]:
+        return self.index.glob(pattern, recursive)
+
+    def files(self) -> Iterable[str]:
+        """
+        :return: Every file in the pack
+        """
+        return self.index.files()
+
+    def read_json(self, path: str) -> Optional[dict]:
+        """
+        Reads a json file. The returned data is shared, so it must be passed to 'write_json' after being edited
+        :param path: The file to read
+        :return: The parsed file. If the file doesn't exist, then it will be None
+        """
+        path = os.path.normpath(path)
+        document = self.documents.get(path)
+        if document is None:
+            if not self.isfile(path):
+                return None
+            document = _JsonDocument(self._load_json(path), None, False)
+            self.documents[path] = document
+        return document.data
+
+    def write_json(self, path: str, data, indent=None):
+        """
+        Writes a json file
+        :param path: The file to write
+        :param data: The json data
+        :param indent: The indentation used if the pack isn't minified
+        """
+        path = os.path.normpath(path)
+        self.documents[path] = _JsonDocument(data, indent, True)
+
+    @abstractmethod
+    def _load_json(self, path: str):
+        raise NotImplementedError
+
+    def _serialize(self, path: str) -> Optional[bytes]:
+        """
+        Serializes a json document in its final style
+        :param path: A file in the pack
+        :return: The file's contents. If the file on disk can be used as is, then it will be None
+        """
+        document = self.documents.get(path)
+        if document is None:
+            return None
+        if not (document.modified or self.minify):
+            return None
+        return dump_json(document.data, None if self.minify else document.indent)
+
+    def _forget(self, path: str):
+        """Drops the documents of a file or folder that is being replaced or removed"""
+        self.documents.pop(path, None)
+        prefix = path + os.sep
+        # Copied first, since other patches can register documents at the same time
+        for document_path in [p for p in list(self.documents) if p.startswith(prefix)]:
+            del self.documents[document_path]
+
+    @abstractmethod
+    def read_bytes(self, path: str) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def source(self, path: str) -> Optional[str]:
+        """
+        Gets the file on disk that holds the final contents of a file
+        :param path: A file in the pack
+        :return: A path on disk. If the file only exists in memory, then it will be None
+        """
+        raise NotImplementedError
+
+    def add_file(self, path: str, src: str):
+        """
+        Adds or replaces a file in the pack with a file from disk
+        :param path: Where the file goes in the pack
+        :param src: The file on disk
+        """
+        self.add_files([(path, src)])
+
+    @abstractmethod
+    def add_files(self, files: Iterable[tuple[str, str]]) -> list[str]:
+        """
+        Adds or replaces many files in the pack with files from disk
+        :param files: Where each file goes in the pack and the file on disk
+        :return: The files that were replaced
+        """
+        raise NotImplementedError
+
+    def _override(self, files: list[tuple[str, str]]) -> list[str]:
+        """
+        Drops everything known about files that are about to be added
+        :param files: Where each file goes in the pack and the file on disk. Paths must be normalized
+        :return: The files that already exist
+        """
+        overridden = []
+        for path, _ in files:
+            self._forget(path)
+            if self.index.isfile(path):
+                overridden.append(path)
+        return overridden
+
+    @abstractmethod
+    def remove(self, path: str):
+        """
+        Removes a file or folder
+        :param path: The file or folder to remove
+        """
+        raise NotImplementedError
+
+    def remove_files(self, paths: Iterable[str]) -> list[str]:
+        """
+        Removes many files and folders at once. Missing paths and paths inside of other removed folders are skipped
+        :param paths: The files and folders to remove
+        :return: Every removed file
+        """
+        removed = set()
+
+        def inside_removed(path: str) -> bool:
+            parent = os.path.dirname(path)
+            while len(parent) > len(self.root):
+                if parent in removed:
+                    return True
+                parent = os.path.dirname(parent)
+            return False
+
+        # Folders are checked before anything inside of them
+        for path in sorted(set(map(os.path.normpath, paths)), key=lambda p: (p.count(os.sep), p)):
+            if not inside_removed(path) and self.exists(path):
+                removed.add(path)
+        return self._remove_paths(sorted(removed))
+
+    @abstractmethod
+    def _remove_paths(self, paths: list[str]) -> list[str]:
+        """
+        :param paths: Existing files and folders that don't contain each other
+        :return: Every removed file
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Writes every modified json document"""
+        pass
+
+    @abstractmethod
+    def delete_empty_folders(self) -> int:
+        """
+        Removes every folder that has no files in it
+        :return: The amount of removed folders
+        """
+        raise NotImplementedError
+
+
+class DiskPackFiles(PackFiles):
+    """
+    A pack that is built in a folder. Json files must already be minified when they are copied in. The folder is
+    indexed the first time it is searched, so files must only be changed through this class after that.
+    """
+
+    def _create_index(self) -> PackIndex:
+        return PackIndex.from_directory(self.root)
+
+    def _load_json(self, path: str):
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def write_json(self, path: str, data, indent=None):
+        super().write_json(path, data, indent)
+
+        # New files are written right away so they can be found on disk
+        path = os.path.normpath(path)
+        if not self.index.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_document(path)
+            self.index.add_file(path)
+
+    def _write_document(self, path: str):
+        # The file might be linked to a shared build
+        if os.path.isfile(path):
+            os.remove(path)
+        with open(path, "wb") as file:
+            file.write(dump_json(self.documents[path].data, None if self.minify else self.documents[path].indent))
+        self.documents[path].modified = False
+
+    def read_bytes(self, path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    def source(self, path: str) -> Optional[str]:
+        return path
+
+    def copy_from(self, src: str, files: Optional[Iterable[str]] = None) -> CopyStats:
+        """
+        Copies a folder into the pack. Json that is parsed to be minified is kept, so later stages don't parse it again
+        :param src: The folder to copy
+        :param files: Files relative to 'src' that should be copied. If None, then every file is copied
+        :return: The throughput of the copy
+        """
+        files = list(files if files is not None else CopyEngine.walk(src))
+        parsed = {}
+        copy_stats = self.copy_engine.copy_tree(src, self.root, files, self.minify, parsed=parsed)
+        self._keep_parsed(parsed)
+        if self._index is not None:
+            for file in files:
+                self.index.add_file(os.path.normpath(os.path.join(self.root, file)))
+        return copy_stats
+
+    def _keep_parsed(self, parsed: dict):
+        for path, data in parsed.items():
+            self.documents[os.path.normpath(path)] = _JsonDocument(data, None, False)
+
+    def add_files(self, files: Iterable[tuple[str, str]]) -> list[str]:
+        files = [(os.path.normpath(path), src) for path, src in files]
+        overridden = self._override(files)
+        # Existing files are removed by the copy, which also breaks links to shared builds
+        parsed = {}
+        self.copy_engine.copy_files([(src, path) for path, src in files], self.minify, parsed=parsed)
+        self._keep_parsed(parsed)
+        for path, _ in files:
+            self.index.add_file(path)
+        return overridden
+
+    def remove(self, path: str):
+        path = os.path.normpath(path)
+        self._forget(path)
+        if self.index.isfile(path):
+            os.remove(path)
+        else:
+            shutil.rmtree(path)
+        self.index.remove(path)
+
+    def _remove_paths(self, paths: list[str]) -> list[str]:
+        files = []
+        folders = []
+        for path in paths:
+            self._forget(path)
+            if self.index.isdir(path):
+                folders.append(path)
+            files += self.index.remove(path)
+
+        # Files are unlinked in batches, so threads aren't started for every file
+        batches = [files[i:i + REMOVE_BATCH_SIZE] for i in range(0, len(files), REMOVE_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=self.copy_engine.workers) as executor:
+            list(executor.map(lambda batch: list(map(os.remove, batch)), batches))
+        # Only empty folders are left
+        for folder in folders:
+            shutil.rmtree(folder)
+        return files
+
+    def flush(self):
+        for path, document in self.documents.items():
+            if document.modified:
+                self._write_document(path)
+
+    def delete_empty_folders(self) -> int:
+        if not os.path.isdir(self.root):
+            return 0
+        removed = self._prune(self.root)[1]
+        if removed > 0:
+            self._index = None
+        return removed
+
+    def _prune(self, directory: str) -> tuple[bool, int]:
+        """
+        Removes empty folders bottom-up, so a folder that only held empty folders is removed in the same pass
+        :param directory: The folder to prune
+        :return: If the folder is now empty and the amount of removed folders
+        """
+        empty = True
+        removed = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    child_empty, child_removed = self._prune(entry.path)
+                    removed += child_removed
+                    if child_empty:
+                        os.rmdir(entry.path)
+                        removed += 1
+                        continue
+                empty = False
+        return empty, removed
+
+
+class VirtualPackFiles(PackFiles):
+    """
+    A pack that only exists in memory. Unmodified files point to the source pack and only json files that have been
+    read or written are held in memory. Nothing is written until the pack is zipped or materialized.
+    """
+
+    def __init__(self, root: str, minify: bool = False, copy_engine: Optional[CopyEngine] = None):
+        super().__init__(root, minify, copy_engine)
+        # File path -> source path on disk. None if the file only exists as a json document
+        self.entries: dict[str, Optional[str]] = {}
+
+    def _create_index(self) -> PackIndex:
+        # Empty folders don't exist in a virtual pack
+        return PackIndex(self.root, prune_empty=True)
+
+    @staticmethod
+    def from_directory(src: str, root: str, minify: bool = False,
+                       files: Optional[Iterable[str]] = None) -> "VirtualPackFiles":
+        """
+        Creates a virtual pack that overlays a folder
+        :param src: The folder on disk
+        :param root: The path that the pack pretends to be at
+        :param minify: Should json files be written without indentation
+        :param files: Files relative to 'src' that are part of the pack. If None, then every file is
+        """
+        if files is None:
+            files = CopyEngine.walk(src)
+
+        pack_files = VirtualPackFiles(root, minify)
+        pack_files.add_files((os.path.join(pack_files.root, file), os.path.join(src, file)) for file in files)
+        return pack_files
+
+    def fork(self, root: str) -> "VirtualPackFiles":
+        """
+        Copies the pack so that it can be built further without changing this pack. Unmodified json documents are
+        dropped and read again from their source
+        :param root: The path that the new pack pretends to be at
+        """
+        pack_files = VirtualPackFiles(root, self.minify, self.copy_engine)
+
+        def move(path: str) -> str:
+            return os.path.normpath(os.path.join(pack_files.root, os.path.relpath(path, self.root)))
+
+        pack_files.entries = {move(path): entry for path, entry in self.entries.items()}
+        pack_files._index = self.index.copy(pack_files.root)
+        pack_files.documents = {move(path): _JsonDocument(copy.deepcopy(document.data), document.indent, True)
+                                for path, document in self.documents.items() if document.modified}
+        return pack_files
+
+    def _add_entry(self, path: str, entry: Optional[str]):
+        path = os.path.normpath(path)
+        self.entries[path] = entry
+        self.index.add_file(path)
+
+    def _remove_entry(self, path: str):
+        path = os.path.normpath(path)
+        self._forget(path)
+        for file in self.index.remove(path):
+            del self.entries[file]
+
+    def _load_json(self, path: str):
+        with open(self.entries[path], "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def write_json(self, path: str, data, indent=None):
+        path = os.path.normpath(path)
+        if path not in self.entries:
+            self._add_entry(path, None)
+        super().write_json(path, data, indent)
+
+    def read_bytes(self, path: str) -> bytes:
+        path = os.path.normpath(path)
+        data = self._serialize(path)
+        if data is not None:
+            return data
+        elif self.minify and path.endswith(".json"):
+            # Unread json is parsed here, so it is still only parsed once
+            with open(self.entries[path], "r", encoding="utf-8") as file:
+                return dump_json(json.load(file), None)
+        else:
+            with open(self.entries[path], "rb") as file:
+                return file.read()
+
+    def source(self, path: str) -> Optional[str]:
+        path = os.path.normpath(path)
+        document = self.documents.get(path)
+        if (document is not None and document.modified) or (self.minify and path.endswith(".json")):
+            return None
+        return self.entries[path]
+
+    def add_files(self, files: Iterable[tuple[str, str]]) -> list[str]:
+        files = [(os.path.normpath(path), src) for path, src in files]
+        overridden = self._override(files)
+        for path, src in files:
+            self._add_entry(path, src)
+        return overridden
+
+    def remove(self, path: str):
+        if self.exists(path):
+            self._remove_entry(path)
+
+    def _remove_paths(self, paths: list[str]) -> list[str]:
+        files = []
+        for path in paths:
+            self._forget(path)
+            for file in self.index.remove(path):
+                del self.entries[file]
+                files.append(file)
+        return files
+
+    def delete_empty_folders(self) -> int:
+        # Folders are removed with their last file
+        return 0
+
+    def materialize(self, dest: str, copy_engine: CopyEngine, extension: Optional[str] = None):
+        """
+        Writes the pack to a folder
+        :param dest: The folder to write to
+        :param copy_engine: Used to copy files that are unmodified
+        :param extension: Only files with this extension are written. If None, then every file is written
+        """
+        for folder in self.index.children.keys():
+            os.makedirs(os.path.join(dest, os.path.relpath(folder, self.root)), exist_ok=True)
+
+        for file in self.entries.keys():
+            if extension is not None and not file.endswith(f".{extension}"):
+                continue
+            file_dest = os.path.join(dest, os.path.relpath(file, self.root))
+            src = self.source(file)
+            if src is not None:
+                copy_engine.copy_file(src, file_dest)
+            else:
+                with open(file_dest, "wb") as output:
+                    output.write(self.read_bytes(file))
@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from timeit import default_timer
+from typing import Optional, Iterable
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request used by Linux filesystems (btrfs, xfs, ...) to share extents between files
+FICLONE = 0x40049409
+
+# Files that are rewritten in place by later build steps and can never share data with the source
+_EDITABLE_EXTENSIONS = (".json", ".mcmeta")
+
+
+def dump_json(data, indent=None) -> bytes:
+    """
+    Serializes json the same way everywhere in a build
+    :param data: The json data
+    :param indent: The indentation. If None, then the json is minified
+    :return: The encoded json
+    """
+    return json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")
+
+
+class LinkMode(Enum):
+    AUTO = "auto"
+    COPY = "copy"
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+
+
+class CopyStats:
+    def __init__(self, files: int, size: int, seconds: float):
+        self.files = files
+        self.size = size
+        self.seconds = seconds
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.size / 1_000_000 / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.files} files ({self.size / 1_000_000:.1f} MB) in {self.seconds:.2f}s, " \
+               f"{self.files_per_second:.0f} files/s, {self.mb_per_second:.1f} MB/s"
+
+
+def _reflink(src: str, dest: str) -> bool:
+    if fcntl is None:
+        return False
+
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+            return True
+        except OSError:
+            return False
+
+
+def _copy_file_range(src: str, dest: str) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        try:
+            while os.copy_file_range(src_file.fileno(), dest_file.fileno(), 1024 * 1024 * 16) > 0:
+                pass
+            return True
+        except OSError:
+            return False
+
+
+class CopyEngine:
+    """
+    Copies trees of files with a bounded amount of threads.
+    """
+
+    def __init__(self, workers: Optional[int] = None, link_mode: str = LinkMode.AUTO.value):
+        """
+        :param workers: The max amount of copy threads. If None or 0, then it is picked based off of the cpu count
+        :param link_mode: How files should be placed in the destination. See 'LinkMode'
+        """
+        self.workers = workers if workers else min(32, (os.cpu_count() or 1) + 4)
+        self.link_mode = LinkMode(link_mode)
+        # Set after the first failed reflink, so unsupported filesystems don't retry for every file
+        self.reflink_supported = True
+
+    def copy_tree(self, src: str, dest: str, files: Optional[Iterable[str]] = None,
+                  minify_json: bool = False, link: bool = False, parsed: Optional[dict] = None) -> CopyStats:
+        """
+        Copies a folder
+        :param src: The folder to copy
+        :param dest: Where the folder is copied to
+        :param files: Files relative to 'src' that should be copied. If None, then every file is copied
+        :param minify_json: Should json files be minified while they are copied
+        :param link: Should every file be hardlinked, including json. Only safe if files in 'dest' are replaced
+                     instead of edited
+        :param parsed: If set, then json that is parsed to be minified is added to it by destination
+        :return: The throughput of the copy
+        """
+        if files is None:
+            files = CopyEngine.walk(src)
+
+        return self.copy_files([(os.path.join(src, f), os.path.join(dest, f)) for f in files], minify_json, link,
+                               parsed)
+
+    def copy_files(self, files: Iterable[tuple[str, str]], minify_json: bool = False,
+                   link: bool = False, parsed: Optional[dict] = None) -> CopyStats:
+        """
+        Copies many files. Missing folders are created
+        :param files: The source and destination of each file
+        :param minify_json: Should json files be minified while they are copied
+        :param link: Should every file be hardlinked. See 'copy_tree'
+        :param parsed: If set, then json that is parsed to be minified is added to it by destination
+        :return: The throughput of the copy
+        """
+        start_time = default_timer()
+        files = list(files)
+
+        # Create every folder once
+        for folder in sorted(set(os.path.dirname(dest) for _, dest in files)):
+            os.makedirs(folder, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            size = sum(executor.map(lambda f: self.copy_file(f[0], f[1], minify_json, link, parsed), files))
+
+        return CopyStats(len(files), size, default_timer() - start_time)
+
+    def copy_file(self, src: str, dest: str, minify_json: bool = False, link: bool = False,
+                  parsed: Optional[dict] = None) -> int:
+        """
+        Copies a single file. The destination's folder must already exist
+        :param src: The file to copy
+        :param dest: Where the file is copied to
+        :param minify_json: Should the file be minified if it is json
+        :param link: Should the file be hardlinked no matter its type or the link mode
+        :param parsed: If set, then the json is added to it when the file is minified
+        :return: The size of the file
+        """
+        # Existing files might be links to the source
+        if os.path.lexists(dest):
+            os.remove(dest)
+
+        if minify_json and src.endswith(".json"):
+            with open(src, "r", encoding="utf-8") as src_file:
+                json_data = json.load(src_file)
+            if parsed is not None:
+                parsed[dest] = json_data
+            data = dump_json(json_data)
+            with open(dest, "wb") as dest_file:
+                dest_file.write(data)
+            return len(data)
+
+        editable = src.endswith(_EDITABLE_EXTENSIONS)
+
+        if link or (self.link_mode == LinkMode.HARDLINK and not editable):
+            try:
+                os.link(src, dest)
+                return os.path.getsize(dest)
+            except OSError:
+                pass
+
+        if self.link_mode in (LinkMode.AUTO, LinkMode.REFLINK) and self.reflink_supported:
+            if _reflink(src, dest):
+                shutil.copymode(src, dest)
+                return os.path.getsize(dest)
+            self.reflink_supported = False
+
+        if self.link_mode == LinkMode.AUTO and _copy_file_range(src, dest):
+            shutil.copymode(src, dest)
+        else:
+            shutil.copy(src, dest)
+        return os.path.getsize(dest)
+
+    @staticmethod
+    def walk(root: str) -> Iterable[str]:
+        """
+        Finds every file in a folder
+        :param root: The folder to search
+        :return: Every file relative to 'root'
+        """
+        return CopyEngine._walk(root, "")
+
+    @staticmethod
+    def _walk(root: str, relative: str):
+        with os.scandir(os.path.join(root, relative)) as entries:
+            for entry in entries:
+                # Hidden files are never part of a pack
+                if entry.name.startswith("."):
+                    continue
+
+                if entry.is_dir(follow_symlinks=True):
+                    yield from CopyEngine._walk(root, os.path.join(relative, entry.name))
+                elif entry.is_file():
+                    yield os.path.join(relative, entry.name)
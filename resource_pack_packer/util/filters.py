@@ -0,0 +1,70 @@
+import os
+import re
+from fnmatch import translate
+from glob import has_magic
+from typing import Iterable, Optional
+
+# Ignore entries with this prefix are regular expressions instead of names or globs
+REGEX_PREFIX = "regex:"
+
+
+class FolderFilter:
+    """
+    Excludes every entry of an asset folder ('assets/<namespace>/<folder>/<entry>') besides the ignored entries.
+    Ignored entries are names, globs or regular expressions prefixed with 'regex:'.
+    """
+
+    def __init__(self, folder: str, ignore: Iterable[str]):
+        """
+        :param folder: The asset folder to filter, e.g. 'textures'
+        :param ignore: The entries of the folder to keep
+        """
+        self.folder = folder
+        self.ignore = list(ignore)
+
+        # Names are compared lowercase, as they always have been
+        self.names = set()
+        patterns = []
+        for ignored in self.ignore:
+            if ignored.startswith(REGEX_PREFIX):
+                patterns.append(ignored[len(REGEX_PREFIX):])
+            elif has_magic(ignored):
+                patterns.append(translate(ignored.lower()))
+            else:
+                self.names.add(ignored.lower())
+        self.pattern: Optional[re.Pattern] = re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+        # Entry name -> is ignored. Every file of an entry shares the decision
+        self.entries: dict[str, bool] = {}
+
+    @property
+    def signature(self) -> tuple:
+        return self.folder, tuple(sorted(map(str.lower, self.ignore)))
+
+    def is_ignored(self, entry: str) -> bool:
+        """
+        :param entry: The name of a file or folder directly inside of the asset folder
+        :return: True if the entry is kept
+        """
+        ignored = self.entries.get(entry)
+        if ignored is None:
+            ignored = entry in self.names or (self.pattern is not None and self.pattern.fullmatch(entry) is not None)
+            self.entries[entry] = ignored
+        return ignored
+
+    def excludes(self, file: str) -> bool:
+        """
+        :param file: A file relative to the pack
+        :return: True if the file is filtered out
+        """
+        parts = os.path.normpath(file).split(os.sep, 4)
+        if len(parts) < 4 or parts[0] != "assets" or parts[2] != self.folder:
+            return False
+        return not self.is_ignored(parts[3])
+
+    def filter(self, files: Iterable[str]) -> list[str]:
+        """
+        :param files: Files relative to the pack
+        :return: The files that aren't filtered out
+        """
+        return [file for file in files if not self.excludes(file)]
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+
+def hash_file(src: str) -> str:
+    """
+    Hashes the contents of a file
+    :param src: The file to hash
+    :return: The sha1 hex digest of the file
+    """
+    digest = hashlib.sha1()
+    with open(src, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_data(data) -> str:
+    """
+    Hashes any json serializable data
+    :param data: The data to hash
+    :return: The sha1 hex digest of the data
+    """
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def scan_files(directory: str, previous: Optional[dict] = None) -> dict:
+    """
+    Records the size, modification time and hash of every file in a directory.
+    Files whose size and modification time match the previous scan reuse the previous hash.
+    :param directory: The directory to scan
+    :param previous: A previous scan of the same directory
+    :return: A dict of relative paths to [size, mtime, hash]
+    """
+    if previous is None:
+        previous = {}
+
+    files = {}
+    for root, dirs, file_names in os.walk(directory):
+        # Hidden files are never part of a pack
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+
+        for file_name in file_names:
+            if file_name.startswith("."):
+                continue
+
+            file = os.path.join(root, file_name)
+            relative_file = os.path.relpath(file, directory)
+            stat = os.stat(file)
+
+            entry = previous.get(relative_file)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                files[relative_file] = entry
+            else:
+                files[relative_file] = [stat.st_size, stat.st_mtime_ns, hash_file(file)]
+    return files
+
+
+class BuildManifest:
+    """
+    Records the inputs of a previous build so that the next build only has to process what changed.
+    """
+
+    def __init__(self, src: str, staging: Optional[str] = None, inputs: Optional[str] = None,
+                 files: Optional[dict] = None, overlays: Optional[dict] = None, outputs: Optional[dict] = None):
+        self.src = src
+        self.staging = staging
+        self.inputs = inputs
+        self.files = files if files is not None else {}
+        self.overlays = overlays if overlays is not None else {}
+        self.outputs = outputs if outputs is not None else {}
+
+    def is_reusable(self, staging: str, inputs: str) -> bool:
+        """
+        Checks if the output of the previous build can be reused
+        :param staging: The directory the pack is built in
+        :param inputs: The hash of every config and patch input
+        :return: True if only changed files need to be rebuilt
+        """
+        return self.staging == staging and self.inputs == inputs and os.path.isdir(staging)
+
+    def diff(self, files: dict) -> Tuple[set, set]:
+        """
+        Compares a new scan of the source files against the previous build
+        :param files: A scan from 'scan_files'
+        :return: The changed (or added) files and the removed files
+        """
+        changed = set(file for file, entry in files.items()
+                      if file not in self.files or self.files[file][2] != entry[2])
+        removed = set(self.files.keys()) - set(files.keys())
+        return changed, removed
+
+    def pop_outputs(self, dirty: set, files: dict) -> Tuple[set, set]:
+        """
+        Forgets the outputs of files that are rebuilt
+        :param dirty: Changed and removed files
+        :param files: A scan from 'scan_files'
+        :return: The outputs to delete and the source files that they replaced, which have to be copied again
+        """
+        outputs = set(self.outputs.pop(file) for file in dirty if file in self.outputs)
+        return outputs, set(file for file in outputs if file in files)
+
+    def invalidate(self):
+        """Removes the saved manifest so a failed build can't be reused"""
+        if os.path.exists(self.src):
+            os.remove(self.src)
+
+    def save(self):
+        if not os.path.exists(os.path.dirname(self.src)):
+            os.makedirs(os.path.dirname(self.src))
+
+        with open(self.src, "w", encoding="utf-8") as file:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "staging": self.staging,
+                "inputs": self.inputs,
+                "files": self.files,
+                "overlays": self.overlays,
+                "outputs": self.outputs
+            }, file, ensure_ascii=False)
+
+    @staticmethod
+    def load(src: str) -> "BuildManifest":
+        if os.path.exists(src):
+            try:
+                with open(src, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                data = None
+
+            if data is not None and data.get("version") == MANIFEST_VERSION:
+                return BuildManifest(src, data["staging"], data["inputs"], data["files"], data["overlays"],
+                                     data["outputs"])
+        return BuildManifest(src)
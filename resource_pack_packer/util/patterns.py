@@ -0,0 +1,65 @@
+import re
+from fnmatch import translate
+from functools import lru_cache
+
+# Max amount of compiled patterns of each kind that are kept
+PATTERN_CACHE_SIZE = 512
+
+# Keys of patch data that hold regular expressions
+_REGEX_KEYS = ("regex", "select")
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_regex(pattern: str, flags: int = 0) -> re.Pattern:
+    """
+    Compiles a regular expression once and reuses it
+    :param pattern: The regular expression
+    :param flags: The re flags
+    :return: The compiled pattern
+    """
+    return re.compile(pattern, flags)
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_glob(pattern: str) -> re.Pattern:
+    """
+    Compiles a glob pattern once and reuses it
+    :param pattern: A glob pattern, like the ones used by fnmatch
+    :return: A compiled pattern that matches the same names
+    """
+    return re.compile(translate(pattern))
+
+
+def precompile(data) -> int:
+    """
+    Compiles every regular expression in patch data, so matching doesn't have to compile them later
+    :param data: Parsed patch json
+    :return: The amount of patterns found
+    """
+    found = 0
+    stack = [data]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in _REGEX_KEYS and isinstance(value, str):
+                    compile_regex(value)
+                    found += 1
+                else:
+                    stack.append(value)
+        elif isinstance(node, list):
+            stack += node
+    return found
+
+
+def pattern_cache_info() -> dict:
+    """
+    :return: The hits, misses and size of every pattern cache
+    """
+    def info(cache) -> dict:
+        cache_info = cache.cache_info()
+        return {"hits": cache_info.hits, "misses": cache_info.misses, "size": cache_info.currsize,
+                "max_size": cache_info.maxsize}
+
+    return {"regex": info(compile_regex), "glob": info(compile_glob)}
+
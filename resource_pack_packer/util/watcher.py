@@ -0,0 +1,126 @@
+import os
+import queue
+import time
+from typing import Iterable, Optional
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, events: queue.Queue):
+        super().__init__()
+        self.events = events
+
+    def on_any_event(self, event):
+        if event.is_directory and event.event_type == "modified":
+            return
+        self.events.put(event.src_path)
+        if hasattr(event, "dest_path") and event.dest_path:
+            self.events.put(event.dest_path)
+
+
+def _snapshot(directories: Iterable[str]) -> dict:
+    files = {}
+    for directory in directories:
+        if os.path.isfile(directory):
+            stat = os.stat(directory)
+            files[directory] = (stat.st_size, stat.st_mtime_ns)
+            continue
+
+        for root, dirs, file_names in os.walk(directory):
+            # Hidden files are never part of a pack
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for file_name in file_names:
+                if file_name.startswith("."):
+                    continue
+                file = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(file)
+                except OSError:
+                    continue
+                files[file] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class Watcher:
+    """
+    Waits for files to change. Uses native file system events when watchdog is installed and polls otherwise.
+    """
+
+    def __init__(self, directories: Iterable[str], interval: float = 0.5, debounce: float = 0.3):
+        """
+        :param directories: The folders and files to watch
+        :param interval: Seconds between polls
+        :param debounce: Seconds without changes before a burst of changes is reported
+        """
+        self.directories = [os.path.normpath(d) for d in directories if os.path.exists(d)]
+        self.interval = interval
+        self.debounce = debounce
+
+        self.observer = None
+        self.events: Optional[queue.Queue] = None
+        self.files: Optional[dict] = None
+
+        if Observer is not None:
+            self.events = queue.Queue()
+            self.observer = Observer()
+            handler = _EventHandler(self.events)
+            for directory in self.directories:
+                if os.path.isdir(directory):
+                    self.observer.schedule(handler, directory, recursive=True)
+                else:
+                    self.observer.schedule(handler, os.path.dirname(directory), recursive=False)
+            self.observer.start()
+        else:
+            self.files = _snapshot(self.directories)
+
+    @property
+    def native(self) -> bool:
+        return self.observer is not None
+
+    def wait(self) -> set[str]:
+        """
+        Blocks until files change and no more changes come in for 'debounce' seconds
+        :return: The absolute paths that changed
+        """
+        if self.native:
+            changes = set()
+            while len(changes) == 0:
+                changes = {self.events.get()}
+                while True:
+                    try:
+                        changes.add(self.events.get(timeout=self.debounce))
+                    except queue.Empty:
+                        break
+                changes = set(filter(self._is_watched, map(os.path.normpath, changes)))
+            return changes
+
+        changes = set()
+        while True:
+            time.sleep(self.debounce if len(changes) > 0 else self.interval)
+            files = _snapshot(self.directories)
+            new_changes = set(file for file in files.keys() | self.files.keys()
+                              if files.get(file) != self.files.get(file))
+            self.files = files
+
+            if len(new_changes) == 0 and len(changes) > 0:
+                return changes
+            changes |= new_changes
+
+    def _is_watched(self, path: str) -> bool:
+        for directory in self.directories:
+            if path == directory:
+                return True
+            if path.startswith(directory + os.sep):
+                return not any(part.startswith(".") for part in os.path.relpath(path, directory).split(os.sep))
+        return False
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
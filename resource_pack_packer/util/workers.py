@@ -0,0 +1,103 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import pool
+from typing import Callable, Iterable, Iterator, Optional
+
+_pool: Optional[pool.Pool] = None
+_listener: Optional[QueueListener] = None
+# Patch steps run on threads, which can all ask for the pool at once
+_pool_lock = threading.Lock()
+# Set in worker processes, which can't start workers of their own
+_is_worker = False
+
+
+def _init_worker(log_queue: multiprocessing.Queue, level: int):
+    """Sends every log record of a worker to the main process"""
+    global _is_worker
+    _is_worker = True
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def get_pool() -> Optional[pool.Pool]:
+    """
+    Gets the worker pool. It is created once and reused by every build, rerun and validation
+    :return: The pool. If called from a worker, then it will be None
+    """
+    global _pool, _listener
+    if _is_worker:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            root = logging.getLogger()
+            log_queue = multiprocessing.Queue()
+            # Only the main process writes logs, so records from workers never interleave
+            _listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+            _listener.start()
+            _pool = pool.Pool(processes=os.cpu_count(), initializer=_init_worker, initargs=(log_queue, root.level))
+            atexit.register(shutdown)
+        return _pool
+
+
+def map_jobs(func: Callable, jobs: Iterable, star: bool = False) -> list:
+    """
+    Runs jobs on the worker pool. Jobs are run in this process when there is only one or when called from a worker
+    :param func: A picklable function
+    :param jobs: The arguments of each job
+    :param star: Should each job's arguments be unpacked
+    :return: The result of each job
+    """
+    jobs = list(jobs)
+    if len(jobs) <= 1 or _is_worker:
+        return [func(*job) if star else func(job) for job in jobs]
+
+    if star:
+        return get_pool().starmap(func, jobs)
+    return get_pool().map(func, jobs)
+
+
+def stream_jobs(func: Callable, jobs: Iterable, star: bool = False) -> Iterator:
+    """
+    Runs jobs on the worker pool and gives back each result as soon as it is done. Jobs are run in this process when
+    there is only one or when called from a worker
+    :param func: A picklable function
+    :param jobs: The arguments of each job
+    :param star: Should each job's arguments be unpacked
+    :return: The result of each job, in the order that they finish
+    """
+    jobs = list(jobs)
+    if len(jobs) <= 1 or _is_worker:
+        for job in jobs:
+            yield func(*job) if star else func(job)
+        return
+
+    if star:
+        jobs = [(func, job) for job in jobs]
+        func = _star
+    yield from get_pool().imap_unordered(func, jobs)
+
+
+def _star(job: tuple):
+    func, args = job
+    return func(*args)
+
+
+def shutdown():
+    """Stops the worker pool and the log listener"""
+    global _pool, _listener
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
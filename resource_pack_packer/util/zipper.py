@@ -0,0 +1,185 @@
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from resource_pack_packer.staging import PackFiles
+
+# Formats that are already compressed and only get bigger when deflated
+STORED_EXTENSIONS = (".png", ".ogg")
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Every member gets the same timestamp and permissions, so the same pack always produces the same archive
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+_EXTERNAL_ATTR = 0o100644 << 16
+
+_METHOD_STORED = 0
+_METHOD_DEFLATED = 8
+# Names are utf-8
+_FLAG_UTF8 = 0x800
+_VERSION = 20
+_VERSION_ZIP64 = 45
+_SYSTEM_UNIX = 3
+
+# Sizes and offsets from this value on are stored in zip64 fields
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+_ZIP64_END_RECORD = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_END_LOCATOR = struct.Struct("<IIQI")
+
+
+class _Member:
+    __slots__ = ("name", "method", "crc", "size", "compressed_size", "offset")
+
+    def __init__(self, name: bytes, method: int, crc: int, size: int, compressed_size: int):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.size = size
+        self.compressed_size = compressed_size
+        self.offset = 0
+
+
+def _compress_member(pack_files: "PackFiles", file: str, compression_level: int) -> tuple[_Member, bytes]:
+    """
+    Reads and compresses a single file. zlib releases the GIL, so files are compressed on every core
+    :return: The file's member and its compressed data
+    """
+    name = os.path.relpath(file, pack_files.root).replace(os.sep, "/").encode("utf-8")
+    file_src = pack_files.source(file)
+
+    if file_src is not None:
+        with open(file_src, "rb") as src:
+            data = src.read()
+    else:
+        data = pack_files.read_bytes(file)
+
+    if file.lower().endswith(STORED_EXTENSIONS) or compression_level == 0:
+        method = _METHOD_STORED
+        compressed = data
+    else:
+        method = _METHOD_DEFLATED
+        # Raw deflate stream, which is what zip files store
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+
+    return _Member(name, method, zlib.crc32(data), len(data), len(compressed)), compressed
+
+
+def _dos_date_time() -> tuple[int, int]:
+    year, month, day, hour, minute, second = ZIP_DATE_TIME
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+class _ZipWriter:
+    """
+    Writes members that are already compressed. zipfile can only compress members itself, so the headers are written
+    here, following the zip specification
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.members: list[_Member] = []
+        self.offset = 0
+
+    def _write(self, data: bytes):
+        self.file.write(data)
+        self.offset += len(data)
+
+    def write(self, member: _Member, compressed: bytes):
+        member.offset = self.offset
+        date, time = _dos_date_time()
+        flags = 0 if member.name.isascii() else _FLAG_UTF8
+
+        size, compressed_size, extra = member.size, member.compressed_size, b""
+        if size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT:
+            size, compressed_size = 0xFFFFFFFF, 0xFFFFFFFF
+            extra = struct.pack("<HHQQ", 1, 16, member.size, member.compressed_size)
+
+        self._write(_LOCAL_HEADER.pack(0x04034b50, _VERSION_ZIP64 if extra else _VERSION, flags, member.method, time,
+                                       date, member.crc, compressed_size, size, len(member.name), len(extra)))
+        self._write(member.name)
+        self._write(extra)
+        self._write(compressed)
+        self.members.append(member)
+
+    def close(self):
+        """Writes the central directory"""
+        start = self.offset
+        date, time = _dos_date_time()
+
+        for member in self.members:
+            # Only fields that don't fit are moved into the zip64 extra field, in this order
+            fields = []
+            size, compressed_size, offset = member.size, member.compressed_size, member.offset
+            if size >= ZIP64_LIMIT:
+                fields.append(size)
+                size = 0xFFFFFFFF
+            if compressed_size >= ZIP64_LIMIT:
+                fields.append(compressed_size)
+                compressed_size = 0xFFFFFFFF
+            if offset >= ZIP64_LIMIT:
+                fields.append(offset)
+                offset = 0xFFFFFFFF
+            extra = struct.pack(f"<HH{len(fields)}Q", 1, len(fields) * 8, *fields) if fields else b""
+
+            version = _VERSION_ZIP64 if extra else _VERSION
+            self._write(_CENTRAL_HEADER.pack(
+                0x02014b50, _SYSTEM_UNIX << 8 | version, version, 0 if member.name.isascii() else _FLAG_UTF8,
+                member.method, time, date, member.crc, compressed_size, size, len(member.name), len(extra), 0, 0, 0,
+                _EXTERNAL_ATTR, offset))
+            self._write(member.name)
+            self._write(extra)
+
+        count = len(self.members)
+        size = self.offset - start
+        if count >= ZIP64_COUNT_LIMIT or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            end = self.offset
+            self._write(_ZIP64_END_RECORD.pack(0x06064b50, _ZIP64_END_RECORD.size - 12, _SYSTEM_UNIX << 8 |
+                                               _VERSION_ZIP64, _VERSION_ZIP64, 0, 0, count, count, size, start))
+            self._write(_ZIP64_END_LOCATOR.pack(0x07064b50, 0, end, 1))
+
+        count = min(count, 0xFFFF)
+        self._write(_END_RECORD.pack(0x06054b50, 0, 0, count, count, min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF),
+                                     0))
+
+
+def write_zip(pack_files: "PackFiles", dest: str, compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+              workers: Optional[int] = None):
+    """
+    Zips a pack. Files are compressed in parallel and written in sorted order with a fixed timestamp, so the same pack
+    always produces the same archive
+    :param pack_files: The pack to zip
+    :param dest: The zip file
+    :param compression_level: The deflate level from 0 (store) to 9
+    :param workers: The max amount of compression threads. If None, then the cpu count is used
+    """
+    if not os.path.exists(os.path.dirname(dest)):
+        os.makedirs(os.path.dirname(dest))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    files = sorted(pack_files.files(), key=lambda f: os.path.relpath(f, pack_files.root).replace(os.sep, "/"))
+    # Bounds how many compressed files are held in memory
+    window = workers * 4
+
+    with open(dest, "wb") as file, ThreadPoolExecutor(max_workers=workers) as executor:
+        zip_writer = _ZipWriter(file)
+        pending = deque()
+        for pack_file in files:
+            pending.append(executor.submit(_compress_member, pack_files, pack_file, compression_level))
+            if len(pending) >= window:
+                zip_writer.write(*pending.popleft().result())
+
+        while len(pending) > 0:
+            zip_writer.write(*pending.popleft().result())
+        zip_writer.close()
@@ -2,14 +2,24 @@ import json
 import logging
 import os
 from enum import Enum
-from functools import singledispatch
 from glob import glob
-from multiprocessing import Pool
+from timeit import default_timer
 from typing import overload, Optional
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
 
 import jsonschema
+from referencing import Registry, Resource
+from referencing.exceptions import NoSuchResource
+from referencing.jsonschema import DRAFT7
 
 from resource_pack_packer.console import add_to_logger_name
+from resource_pack_packer.util.workers import stream_jobs
+
+SCHEMA_DIR = "schema"
+
+# Amount of files sent to a worker at once
+VALIDATION_CHUNK_SIZE = 64
 
 
 class AssetType(Enum):
@@ -52,48 +62,155 @@ class AssetType(Enum):
                 return os.path.join("minecraft", "assets", "sounds.schema.json")
 
 
-def validate(pack: str, logger_name: str):
+class ReportFormat(Enum):
+    JSON = "json"
+    JUNIT = "junit"
+
+    @staticmethod
+    def get_extension(report_format: "ReportFormat") -> str:
+        match report_format:
+            case ReportFormat.JSON:
+                return "json"
+            case ReportFormat.JUNIT:
+                return "xml"
+
+
+class AssetResult:
+    """
+    The outcome of validating one file
+    """
+
+    def __init__(self, file: str, asset_type: AssetType, errors: list[str], warnings: list[str], seconds: float):
+        self.file = file
+        self.asset_type = asset_type
+        self.errors = errors
+        self.warnings = warnings
+        self.seconds = seconds
+
+    @property
+    def passed(self) -> bool:
+        return len(self.errors) == 0
+
+
+def validate(pack: str, logger_name: str, report: Optional[str] = None,
+             report_format: ReportFormat = ReportFormat.JSON) -> list[AssetResult]:
+    """
+    Validates every blockstate, model and sound index of a pack
+    :param pack: The folder of the pack
+    :param logger_name: The name of the pack's logger
+    :param report: Where a report of every file is written. If None, then no report is written
+    :param report_format: The format of the report
+    :return: The result of every file
+    """
     logger = add_to_logger_name(logger_name, "validation")
+    start_time = default_timer()
 
     assets_dir = os.path.join(pack, "assets", "*")
+    results = []
 
     # Blockstates
     logger.info("Validating blockstates...")
-    validate_assets(assets_dir, AssetType.BLOCKSTATE, "json", logger)
+    results += validate_assets(assets_dir, AssetType.BLOCKSTATE, "json", logger)
     logger.info("Validated blockstates.")
 
     # Models
     logger.info("Validating models...")
-    validate_assets(assets_dir, AssetType.MODEL, "json", logger)
+    results += validate_assets(assets_dir, AssetType.MODEL, "json", logger)
     logger.info("Validated models.")
 
-    # Sound index
-    validate_asset(os.path.join(assets_dir, AssetType.get_path(AssetType.SOUND_INDEX)), AssetType.SOUND_INDEX, logger)
+    # Sound index of every namespace
+    results += validate_assets(assets_dir, AssetType.SOUND_INDEX, "json", logger)
+
+    seconds = default_timer() - start_time
+    failed = sum(1 for result in results if not result.passed)
+    logger.info(f"Validated {len(results)} files in {seconds} seconds. {failed} didn't match their schema")
+
+    if report is not None:
+        write_report(results, pack, report, report_format, seconds)
+        logger.info(f"Wrote validation report: {report}")
+    return results
+
+
+# Compiled validators of this process. Each worker compiles a validator once and reuses it for every file
+_validators: dict[AssetType, jsonschema.protocols.Validator] = {}
 
 
 def get_schema(asset_type: AssetType) -> dict:
-    with open(os.path.join("schema", AssetType.get_schema_path(asset_type)), "r") as raw_schema:
+    with open(os.path.join(SCHEMA_DIR, AssetType.get_schema_path(asset_type)), "r") as raw_schema:
         parsed_schema = json.load(raw_schema)
     return parsed_schema
 
 
-@singledispatch
-def validate_asset(assets_dir: str, asset_type: AssetType, logger: logging.Logger, schema: Optional[dict] = None) -> bool:
-    if schema is None:
-        schema = get_schema(asset_type)
+def _retrieve_schema(uri: str) -> Resource:
+    """
+    Loads a referenced schema from the local schema folder, so validation never uses the network
+    :param uri: The schema's uri
+    :return: The schema
+    """
+    path = urlsplit(uri).path
+    # Schemas are found by their path after the 'schema' folder or by their name
+    relative = path.split("/schema/", 1)[1] if "/schema/" in path else os.path.basename(path)
+    file = os.path.join(SCHEMA_DIR, *relative.split("/"))
+    if not os.path.isfile(file):
+        raise NoSuchResource(ref=uri)
 
-    file = os.path.join(assets_dir)
+    with open(file, "r") as raw_schema:
+        return Resource.from_contents(json.load(raw_schema), default_specification=DRAFT7)
 
-    if os.path.exists(file):
-        with open(file, "r") as raw_data:
-            data = json.load(raw_data)
 
-        try:
-            jsonschema.validate(data, schema)
-        except jsonschema.ValidationError as e:
-            logger.warning(f"{file} didn't match schema:\n{e.message}")
-            return False
+def create_validator(schema: dict) -> jsonschema.protocols.Validator:
+    """
+    Compiles a schema. The schema itself is only checked here
+    :param schema: The parsed schema
+    :return: A validator that resolves references from the local schema folder
+    """
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema, registry=Registry(retrieve=_retrieve_schema))
 
+
+def get_validator(asset_type: AssetType) -> jsonschema.protocols.Validator:
+    """
+    Gets the compiled validator of an asset type. It is created the first time that it is used in each process
+    :param asset_type: The type of asset
+    :return: The validator
+    """
+    validator = _validators.get(asset_type)
+    if validator is None:
+        validator = create_validator(get_schema(asset_type))
+        _validators[asset_type] = validator
+    return validator
+
+
+def check_asset(file: str, asset_type: AssetType,
+                validator: Optional[jsonschema.protocols.Validator] = None) -> AssetResult:
+    """
+    Validates a file without logging, so it can run on a worker
+    :param file: The file to validate
+    :param asset_type: The type of asset
+    :param validator: The validator to use. If None, then the asset type's validator is used
+    :return: The result
+    """
+    start_time = default_timer()
+    if validator is None:
+        validator = get_validator(asset_type)
+    errors = []
+    warnings = []
+
+    # Files that can't be read fail instead of stopping the whole validation
+    try:
+        with open(file, "r", encoding="utf-8") as raw_data:
+            data = json.load(raw_data)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return AssetResult(file, asset_type, [f"Invalid json: {e}"], warnings, default_timer() - start_time)
+    except OSError as e:
+        return AssetResult(file, asset_type, [f"Couldn't read file: {e}"], warnings, default_timer() - start_time)
+
+    # Reports the same error as 'jsonschema.validate'
+    error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+    if error is not None:
+        errors.append(error.message)
+    else:
         # Asset specific checks
         match asset_type:
             case AssetType.MODEL:
@@ -105,23 +222,99 @@ def validate_asset(assets_dir: str, asset_type: AssetType, logger: logging.Logge
                             for face in element["faces"].values():
                                 # Texture
                                 if "texture" in face and face["texture"] == "#missing":
-                                    logger.warning(f"Missing texture in: {file}")
+                                    warnings.append("Missing texture")
+
+    return AssetResult(file, asset_type, errors, warnings, default_timer() - start_time)
 
-    return True
 
+def _log_result(result: AssetResult, logger: logging.Logger):
+    for error in result.errors:
+        logger.warning(f"{result.file} didn't match schema:\n{error}")
+    for warning in result.warnings:
+        logger.warning(f"{warning} in: {result.file}")
 
-def validate_assets(asset_dir: str, asset_type: AssetType, extension: str, logger: logging.Logger):
+
+def validate_assets(asset_dir: str, asset_type: AssetType, extension: str,
+                    logger: logging.Logger) -> list[AssetResult]:
+    """
+    Validates files in chunks on the worker pool. Results are logged as soon as each chunk is done
+    :return: The result of every file, sorted by file
+    """
     files = glob(os.path.join(asset_dir, AssetType.get_path(asset_type)), recursive=True)
-    parsed_schema = get_schema(asset_type)
     filtered_files = []
 
     for file in files:
         if os.path.isfile(file) and file.endswith(f".{extension}"):
-            filtered_files.append([file, asset_type, logger, parsed_schema])
+            filtered_files.append(file)
+
+    # Workers compile the schema themselves, so only file names are sent
+    chunks = [(filtered_files[i:i + VALIDATION_CHUNK_SIZE], asset_type)
+              for i in range(0, len(filtered_files), VALIDATION_CHUNK_SIZE)]
+    results = []
+    for chunk_results in stream_jobs(_validate_chunk, chunks, star=True):
+        for result in chunk_results:
+            _log_result(result, logger)
+        results += chunk_results
+        logger.debug(f"Validated [{len(results)}/{len(filtered_files)}]")
+
+    results.sort(key=lambda result: result.file)
+    return results
+
+
+def _validate_chunk(files: list[str], asset_type: AssetType) -> list[AssetResult]:
+    return [check_asset(file, asset_type) for file in files]
+
+
+def write_report(results: list[AssetResult], pack: str, path: str, report_format: ReportFormat, seconds: float):
+    """
+    Writes the results of a validation to a file that other tools can read
+    :param results: The result of every file
+    :param pack: The folder of the pack. Files are written relative to it
+    :param path: Where the report is written
+    :param report_format: The format of the report
+    :param seconds: How long the whole validation took
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    failed = sum(1 for result in results if not result.passed)
 
-    with Pool(processes=os.cpu_count()) as p:
-        p.map(_validate_assets, filtered_files)
+    match report_format:
+        case ReportFormat.JSON:
+            report = {
+                "pack": os.path.basename(pack),
+                "files": len(results),
+                "failed": failed,
+                "seconds": seconds,
+                "results": [{
+                    "file": os.path.relpath(result.file, pack).replace(os.sep, "/"),
+                    "type": result.asset_type.value,
+                    "passed": result.passed,
+                    "errors": result.errors,
+                    "warnings": result.warnings,
+                    "seconds": result.seconds
+                } for result in results]
+            }
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2)
+        case ReportFormat.JUNIT:
+            suites = ElementTree.Element("testsuites", name=os.path.basename(pack), tests=str(len(results)),
+                                         failures=str(failed), time=f"{seconds:.6f}")
+            for asset_type in AssetType:
+                type_results = [result for result in results if result.asset_type == asset_type]
+                if len(type_results) == 0:
+                    continue
 
+                suite = ElementTree.SubElement(
+                    suites, "testsuite", name=asset_type.value, tests=str(len(type_results)),
+                    failures=str(sum(1 for result in type_results if not result.passed)),
+                    time=f"{sum(result.seconds for result in type_results):.6f}")
+                for result in type_results:
+                    case = ElementTree.SubElement(suite, "testcase", classname=asset_type.value,
+                                                  name=os.path.relpath(result.file, pack).replace(os.sep, "/"),
+                                                  time=f"{result.seconds:.6f}")
+                    for error in result.errors:
+                        failure = ElementTree.SubElement(case, "failure", message=error.splitlines()[0] if error else "")
+                        failure.text = error
+                    if len(result.warnings) > 0:
+                        ElementTree.SubElement(case, "system-out").text = "\n".join(result.warnings)
 
-def _validate_assets(arg: list):
-    validate_asset(arg[0], arg[1], arg[2], arg[3])
+            ElementTree.ElementTree(suites).write(path, encoding="utf-8", xml_declaration=True)
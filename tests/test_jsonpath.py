@@ -0,0 +1,185 @@
+import copy
+import re
+
+import pytest
+
+from resource_pack_packer.jsonpath import JsonPath
+
+
+def _set_json(root, location: list, data, merge: bool, add: bool):
+    """The recursive helper that JsonPath.set replaced, kept to compare against"""
+    if len(location) > 1:
+        if location[0] == "*":
+            if isinstance(root, dict):
+                for key in root.keys():
+                    root[key] = _set_json(root[key], location[1:], data, merge, add)
+            elif isinstance(root, list):
+                for i in range(len(root)):
+                    root[i] = _set_json(root[i], location[1:], data, merge, add)
+        else:
+            if location[0] in root:
+                root[location[0]] = _set_json(root[location[0]], location[1:], data, merge, add)
+            elif add:
+                new_json = data
+                for key in reversed(location):
+                    new_json = {key: new_json}
+                root |= new_json
+    else:
+        if location[0] == "*":
+            if isinstance(root, dict):
+                for key in root.keys():
+                    root[key] = data
+            elif isinstance(root, list):
+                for i in range(len(root)):
+                    root[i] = data
+        else:
+            if merge and isinstance(data, dict) and isinstance(root[location[0]], dict):
+                root[location[0]] |= data
+            else:
+                root[location[0]] = data
+    return root
+
+
+def _replace_json(root, location: list, select: str, replacement: str):
+    """The recursive helper that JsonPath.replace replaced, kept to compare against"""
+    if len(location) > 1:
+        if location[0] == "*":
+            if isinstance(root, dict):
+                for key in root.keys():
+                    root[key] = _replace_json(root[key], location[1:], select, replacement)
+            elif isinstance(root, list):
+                for i in range(len(root)):
+                    root[i] = _replace_json(root[i], location[1:], select, replacement)
+        elif location[0] in root:
+            root[location[0]] = _replace_json(root[location[0]], location[1:], select, replacement)
+    else:
+        if location[0] == "*":
+            for key, value in root.items():
+                root[key] = re.sub(select, replacement, value)
+        else:
+            root[location[0]] = re.sub(select, replacement, root[location[0]])
+    return root
+
+
+BLOCKSTATE = {
+    "variants": {
+        "facing=north": {"model": "block/stone", "y": 90},
+        "facing=south": {"model": "block/stone_mirrored"},
+        "facing=east": {"model": "block/stone", "y": 270}
+    },
+    "multipart": []
+}
+
+# The old helpers couldn't go through lists of variants
+WEIGHTED_BLOCKSTATE = {
+    "variants": {
+        "": [{"model": "block/stone"}, {"model": "block/stone", "weight": 2}]
+    }
+}
+
+MODEL = {
+    "parent": "block/cube",
+    "textures": {"all": "block/stone", "particle": "block/stone"},
+    "elements": [
+        {"from": [0, 0, 0], "to": [16, 8, 16], "faces": {"up": {"texture": "#all"}, "down": {"texture": "#all"}}},
+        {"from": [0, 8, 0], "to": [8, 16, 8], "faces": {"north": {"texture": "#particle", "cullface": "north"}}}
+    ]
+}
+
+SET_CASES = [
+    # Wildcard at the end always replaces, even when merging
+    ("variants/*", {"model": "block/dirt"}, True, True),
+    ("variants/*", {"model": "block/dirt"}, False, True),
+    # A name at the end merges into an existing object
+    ("variants/facing=north", {"model": "block/dirt", "x": 180}, True, True),
+    ("variants/facing=north", {"model": "block/dirt", "x": 180}, False, True),
+    # Merging needs an object on both sides
+    ("variants/facing=north/y", 270, True, True),
+    ("variants/facing=north/model", {"model": "block/dirt"}, True, True),
+    # Wildcards on the way
+    ("variants/*/model", "block/dirt", False, True),
+    ("textures/*", "block/dirt", False, True),
+    # Missing parents are created, unless 'add' is off
+    ("display/gui/rotation", [30, 225, 0], False, True),
+    ("display/gui/rotation", [30, 225, 0], False, False),
+    ("display/gui", {"scale": [1, 1, 1]}, False, True),
+]
+
+
+@pytest.mark.parametrize("location,data,merge,add", SET_CASES)
+def test_set_matches_old_set_json(location, data, merge, add):
+    document = BLOCKSTATE if location.startswith("variants") else MODEL
+    expected = _set_json(copy.deepcopy(document), location.split("/"), copy.deepcopy(data), merge, add)
+    assert JsonPath(location).set(copy.deepcopy(document), data, merge, add) == expected
+
+
+def test_set_copies_data_per_location():
+    document = JsonPath("variants/*").set(copy.deepcopy(BLOCKSTATE), {"model": "block/dirt"})
+    document["variants"]["facing=north"]["model"] = "block/changed"
+    assert document["variants"]["facing=south"] == {"model": "block/dirt"}
+
+
+def test_set_merge_adds_missing_name():
+    # The old helper raised KeyError here
+    document = JsonPath("variants/facing=west").set(copy.deepcopy(BLOCKSTATE), {"model": "block/dirt"}, merge=True)
+    assert document["variants"]["facing=west"] == {"model": "block/dirt"}
+
+
+@pytest.mark.parametrize("location,select,replacement", [
+    ("variants/*/model", "block/", "block/new_"),
+    ("textures/*", "stone", "dirt"),
+    ("parent", "cube", "cube_all"),
+])
+def test_replace_matches_old_replace_json(location, select, replacement):
+    document = BLOCKSTATE if location.startswith("variants") else MODEL
+    expected = _replace_json(copy.deepcopy(document), location.split("/"), select, replacement)
+    assert JsonPath(location).replace(copy.deepcopy(document), re.compile(select), replacement) == expected
+
+
+def test_replace_skips_missing_names_and_other_types():
+    document = copy.deepcopy(BLOCKSTATE)
+    JsonPath("variants/*/y").replace(document, re.compile("9"), "1")
+    JsonPath("variants/*/missing").replace(document, re.compile(".*"), "x")
+    assert document == BLOCKSTATE
+
+
+def test_descent_selects_every_level():
+    document = JsonPath("**/texture").replace(copy.deepcopy(MODEL), re.compile("^#"), "#new_")
+    textures = [face["texture"] for element in document["elements"] for face in element["faces"].values()]
+    assert textures == ["#new_all", "#new_all", "#new_particle"]
+    # Only strings at that name change
+    assert document["textures"] == MODEL["textures"]
+
+    document = JsonPath("elements/**").replace(copy.deepcopy(MODEL), re.compile("north"), "south")
+    assert document["elements"][1]["faces"]["north"]["cullface"] == "south"
+    assert document["textures"] == MODEL["textures"]
+
+
+def test_descent_targets_parents_first():
+    targets = JsonPath("**").targets({"a": {"b": [1]}})
+    assert [key for _, key in targets] == ["a", "b", 0]
+
+
+def test_list_indexes():
+    document = JsonPath("elements/1/from").set(copy.deepcopy(MODEL), [4, 4, 4])
+    assert document["elements"][1]["from"] == [4, 4, 4]
+    assert document["elements"][0]["from"] == [0, 0, 0]
+
+    document = JsonPath("elements/-1/to/1").set(copy.deepcopy(MODEL), 12)
+    assert document["elements"][1]["to"] == [8, 12, 8]
+
+    # Indexes out of range select nothing
+    assert JsonPath("elements/2/from").targets(copy.deepcopy(MODEL)) == []
+    assert JsonPath("elements/2/from").set(copy.deepcopy(MODEL), [1, 1, 1]) == MODEL
+
+    # Numbers are still names in objects
+    document = JsonPath("variants/0").set({"variants": {}}, {"model": "block/dirt"})
+    assert document == {"variants": {"0": {"model": "block/dirt"}}}
+
+
+def test_wildcard_selects_list_items():
+    document = JsonPath("variants/*/*/model").set(copy.deepcopy(WEIGHTED_BLOCKSTATE), "block/dirt")
+    assert document["variants"][""] == [{"model": "block/dirt"}, {"model": "block/dirt", "weight": 2}]
+
+    document = JsonPath("variants/*/*").set(copy.deepcopy(WEIGHTED_BLOCKSTATE), {"model": "block/dirt"}, merge=True)
+    assert document["variants"][""] == [{"model": "block/dirt"}, {"model": "block/dirt"}]
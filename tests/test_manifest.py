@@ -0,0 +1,52 @@
+import json
+import os
+import time
+
+from resource_pack_packer.util.manifest import BuildManifest, scan_files
+
+MODELS = os.path.join("assets", "minecraft", "models")
+
+
+def _write(pack, file, data):
+    path = os.path.join(pack, file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_rebuild_after_model_edit_copies_replaced_source_model(tmp_path):
+    pack = str(tmp_path)
+    cube = os.path.join(MODELS, "block", "cube.json")
+    slab = os.path.join(MODELS, "block", "slab.json")
+    rpp = os.path.join(MODELS, "rpp", "slab.rpp.json")
+    _write(pack, cube, {"elements": []})
+    _write(pack, slab, {"parent": "block/cube"})
+    _write(pack, rpp, {"identifier": "minecraft:block/slab",
+                       "modify": {"type": "translate", "model": "block/slab", "arguments": {"x": 1}}})
+
+    # The RPP model was written over the model it modifies
+    manifest = BuildManifest(os.path.join(pack, "manifest.json"), files=scan_files(pack), outputs={rpp: slab})
+
+    time.sleep(0.01)
+    _write(pack, cube, {"elements": [{"from": [0, 0, 0], "to": [16, 8, 16], "faces": {}}]})
+    files = scan_files(pack, manifest.files)
+    changed, removed = manifest.diff(files)
+    assert changed == {cube}
+
+    # Every RPP model is rebuilt when a model changes
+    outputs, replaced = manifest.pop_outputs(changed | removed | {rpp}, files)
+    assert outputs == {slab}
+    assert replaced == {slab}
+    assert manifest.outputs == {}
+
+
+def test_pop_outputs_skips_outputs_without_source(tmp_path):
+    pack = str(tmp_path)
+    rpp = os.path.join(MODELS, "rpp", "slab.rpp.json")
+    output = os.path.join(MODELS, "block", "slab_shifted.json")
+    _write(pack, rpp, {})
+
+    manifest = BuildManifest(os.path.join(pack, "manifest.json"), outputs={rpp: output})
+    outputs, replaced = manifest.pop_outputs({rpp}, scan_files(pack))
+    assert outputs == {output}
+    assert replaced == set()
@@ -0,0 +1,110 @@
+import copy
+
+import pytest
+
+from resource_pack_packer.preprocessor import RPPModel, ModelRepository
+from resource_pack_packer.staging import VirtualPackFiles
+
+SLAB = {
+    "parent": "block/block",
+    "textures": {"top": "block/stone", "side": "block/stone_side"},
+    "elements": [
+        {"from": [0, 0, 0], "to": [16, 8, 16], "faces": {
+            "up": {"uv": [0, 0, 16, 16], "texture": "#top", "cullface": "up"},
+            "north": {"uv": [0, 8, 16, 16], "texture": "#side", "cullface": "north"},
+            "east": {"uv": [0, 8, 16, 16], "texture": "#side", "cullface": "east"}}},
+        {"from": [4, 8, 2.5], "to": [12, 12, 6], "faces": {"south": {"uv": [4, 4, 12, 8], "texture": "#side"}}}
+    ]
+}
+
+TRANSFORMS = [
+    {"type": "translate", "arguments": {"y": 4}},
+    {"type": "scale", "arguments": {"y": 0.5, "origin": [8, 0, 8]}},
+    {"type": "rotate", "arguments": {"axis": "x", "angle": 90}},
+    {"type": "rotate", "arguments": {"axis": "y", "angle": -22.5, "rescale": True}}
+]
+
+
+def _process(rpp: dict, models: dict) -> list[dict]:
+    pack = VirtualPackFiles("/pack")
+    for name, data in models.items():
+        pack.write_json(f"/pack/assets/minecraft/models/block/{name}.json", copy.deepcopy(data))
+    return RPPModel.parse(rpp).process(ModelRepository(pack))[0].elements
+
+
+def _modify(modify_type: str, arguments: dict, model: str = "slab", models: dict = None) -> list[dict]:
+    return _process({"identifier": "minecraft:block/out",
+                     "modify": {"type": modify_type, "model": f"block/{model}", "arguments": arguments}},
+                    models if models is not None else {"slab": SLAB})
+
+
+def _placement(elements: list[dict]) -> list[dict]:
+    return [{key: element[key] for key in ("from", "to", "rotation") if key in element} for element in elements]
+
+
+ROTATION = {"origin": [8.0, 8.0, 8.0], "axis": "y", "angle": 22.5, "rescale": True}
+
+
+# Translate and flip match the json based implementation that geometry replaced. Rotations follow the right hand rule
+@pytest.mark.parametrize("modify_type,arguments,expected", [
+    ("translate", {"x": 1, "y": 0.5}, [
+        {"from": [1, 0.5, 0.0], "to": [17, 8.5, 16.0]},
+        {"from": [5, 8.5, 2.5], "to": [13, 12.5, 6.0]}]),
+    ("flip", {"x": True, "z": True}, [
+        {"from": [0.0, 0, 0.0], "to": [16.0, 8, 16.0]},
+        {"from": [4.0, 8, 10.0], "to": [12.0, 12, 13.5]}]),
+    ("rotate", {"axis": "y", "angle": 90}, [
+        {"from": [0, 0, 0], "to": [16, 8, 16]},
+        {"from": [2.5, 8, 4], "to": [6, 12, 12]}]),
+    # 90 degrees move the geometry and the 22.5 degrees left become the element rotation
+    ("rotate", {"axis": "y", "angle": 112.5, "rescale": True}, [
+        {"from": [0, 0, 0], "to": [16, 8, 16], "rotation": ROTATION},
+        {"from": [2.5, 8, 4], "to": [6, 12, 12], "rotation": ROTATION}]),
+    ("scale", {"x": 0.5, "origin": [0, 0, 0]}, [
+        {"from": [0, 0, 0], "to": [8, 8, 16]},
+        {"from": [2, 8, 2.5], "to": [6, 12, 6]}]),
+    ("matrix", {"matrix": [[0, 0, 1, 0], [0, 1, 0, 0], [-1, 0, 0, 16], [0, 0, 0, 1]]}, [
+        {"from": [0, 0, 0], "to": [16, 8, 16]},
+        {"from": [2.5, 8, 4], "to": [6, 12, 12]}]),
+    ("transform", {"transforms": TRANSFORMS}, [
+        {"from": [0, 0, 2], "to": [16, 16, 6], "rotation": ROTATION | {"angle": -22.5}},
+        {"from": [4, 10, 6], "to": [12, 13.5, 8], "rotation": ROTATION | {"angle": -22.5}}]),
+])
+def test_modify_types(modify_type, arguments, expected):
+    assert _placement(_modify(modify_type, arguments)) == expected
+
+
+def test_transform_matches_steps():
+    # Every step as its own rpp model, each reading the output of the one before
+    models = {"slab": SLAB}
+    model = "slab"
+    for i, step in enumerate(TRANSFORMS):
+        elements = _modify(step["type"], step["arguments"], model, models)
+        model = f"step_{i}"
+        models[model] = {"parent": SLAB["parent"], "textures": SLAB["textures"], "elements": elements}
+
+    assert _modify("transform", {"transforms": TRANSFORMS}) == models[model]["elements"]
+
+
+def test_rotate_moves_faces():
+    elements = _modify("rotate", {"axis": "y", "angle": 90})
+    assert {direction: face.get("cullface") for direction, face in elements[0]["faces"].items()} == \
+           {"up": "up", "west": "west", "north": "north"}
+    assert list(elements[1]["faces"]) == ["east"]
+
+
+def test_full_turn_is_identity():
+    step = {"type": "rotate", "arguments": {"axis": "x", "angle": 90}}
+    assert _modify("transform", {"transforms": [step] * 4}) == SLAB["elements"]
+
+
+@pytest.mark.parametrize("transforms", [
+    # Element rotations must be a multiple of 22.5
+    [{"type": "rotate", "arguments": {"axis": "y", "angle": 30}}],
+    # Element rotations can only be the last step
+    [{"type": "rotate", "arguments": {"axis": "y", "angle": 22.5}},
+     {"type": "rotate", "arguments": {"axis": "y", "angle": 90}}],
+])
+def test_invalid_rotations(transforms):
+    with pytest.raises(ValueError):
+        _modify("transform", {"transforms": transforms})
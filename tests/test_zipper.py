@@ -0,0 +1,66 @@
+import os
+import zipfile
+
+import pytest
+
+from resource_pack_packer.staging import DiskPackFiles
+from resource_pack_packer.util import zipper
+from resource_pack_packer.util.zipper import write_zip, ZIP_DATE_TIME
+
+FILES = {
+    "pack.mcmeta": b'{"pack": {"pack_format": 9}}',
+    "assets/minecraft/models/block/stone.json": b'{"parent": "block/cube_all"}' * 100,
+    "assets/minecraft/textures/block/stone.png": os.urandom(2000),
+    "assets/minecraft/lang/été.json": b"{}",
+    "assets/minecraft/empty.json": b"",
+}
+
+
+@pytest.fixture
+def pack(tmp_path):
+    root = tmp_path / "pack"
+    for file, data in FILES.items():
+        path = root / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return DiskPackFiles(str(root))
+
+
+def _read(dest):
+    with zipfile.ZipFile(dest) as zip_file:
+        assert zip_file.testzip() is None
+        return {info.filename: (info, zip_file.read(info)) for info in zip_file.infolist()}
+
+
+@pytest.mark.parametrize("compression_level", [0, 6, 9])
+def test_members_match_files(pack, tmp_path, compression_level):
+    dest = str(tmp_path / "out" / "pack.zip")
+    write_zip(pack, dest, compression_level, workers=4)
+
+    members = _read(dest)
+    assert list(members) == sorted(FILES)
+    for file, (info, data) in members.items():
+        assert data == FILES[file]
+        assert info.date_time == ZIP_DATE_TIME
+        stored = compression_level == 0 or file.endswith(".png")
+        assert info.compress_type == (zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+
+
+def test_same_pack_produces_same_archive(pack, tmp_path):
+    first, second = str(tmp_path / "a.zip"), str(tmp_path / "b.zip")
+    write_zip(pack, first, workers=1)
+    os.utime(os.path.join(pack.root, "pack.mcmeta"), (0, 0))
+    write_zip(pack, second, workers=4)
+
+    with open(first, "rb") as a, open(second, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_zip64_fields(pack, tmp_path, monkeypatch):
+    # Every size, offset and count is moved into zip64 fields
+    monkeypatch.setattr(zipper, "ZIP64_LIMIT", 0)
+    monkeypatch.setattr(zipper, "ZIP64_COUNT_LIMIT", 0)
+    dest = str(tmp_path / "pack.zip")
+    write_zip(pack, dest)
+
+    assert {file: data for file, (_, data) in _read(dest).items()} == FILES